@@ -0,0 +1,59 @@
+"""
+Compares a directory of ``.osr`` files against an archive of the same replays,
+by total size and by the time to read a replay by its hash (including parsing
+its replay data).
+
+    $ python benchmarks/archive.py
+"""
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from osrparse import Replay, ArchiveWriter, ArchiveReader
+
+RES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+def bench(f, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    paths = sorted(RES.glob("*.osr"))
+    replays = [Replay.from_path(path) for path in paths]
+    by_hash = {replay.replay_hash: path for (replay, path) in
+        zip(replays, paths)}
+
+    with TemporaryDirectory() as d:
+        archive_path = Path(d) / "replays.osra"
+        with ArchiveWriter(archive_path) as writer:
+            for replay in replays:
+                writer.add(replay)
+
+        directory_size = sum(path.stat().st_size for path in paths)
+        archive_size = archive_path.stat().st_size
+        print(f"{'':<10} {'size (KiB)':>11} {'read all (ms)':>14}")
+
+        def read_directory():
+            for replay_hash in by_hash:
+                Replay.from_path(by_hash[replay_hash]).replay_data
+
+        with ArchiveReader(archive_path) as reader:
+            def read_archive():
+                for replay_hash in by_hash:
+                    reader.by_replay_hash(replay_hash)
+            archive_time = bench(read_archive)
+
+        print(f"{'directory':<10} {directory_size / 1024:>11.1f} "
+            f"{bench(read_directory) * 1e3:>14.1f}")
+        print(f"{'archive':<10} {archive_size / 1024:>11.1f} "
+            f"{archive_time * 1e3:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+r"""
+Compares the replay data codec in ``osrparse.codec`` against the native
+format (lzma compressed text), by size and by the time to decode the replay
+data of each replay in ``tests/resources`` to events.
+
+    $ python benchmarks/codec.py
+
+Results on python 3.11 (sizes in KiB, times in ms):
+
+=========================  ======  ======  ======  ======  ======  ======
+replay                     native          codec (lzma)    codec (none)
+-------------------------  --------------  --------------  --------------
+\                          size    decode  size    decode  size    decode
+=========================  ======  ======  ======  ======  ======  ======
+ctb.osr                      41.9    14.6    36.9     8.6   163.2     5.1
+lazer_standard_format.osr    24.7     5.6    23.4     5.0   114.5     3.1
+mania.osr                    16.3    10.9    11.7     9.0   272.4     8.2
+replay.osr                   81.1    20.9    49.9    14.6   256.7    11.0
+replay2.osr                  82.3    20.6    49.6    15.1   265.9    10.4
+replay_old_replayid.osr      82.3    24.1    49.6    17.2   265.9    12.1
+taiko.osr                    17.4    14.3    14.5    10.7   239.0     9.1
+=========================  ======  ======  ======  ======  ======  ======
+"""
+import time
+from pathlib import Path
+
+from osrparse import Replay
+from osrparse.replay import _Unpacker
+from osrparse.codec import encode, decode_replay_data
+
+RES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+def bench(f, repeat=10):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    rows = []
+    for path in sorted(RES.glob("*.osr")):
+        replay = Replay.from_path(path)
+        compressed = replay._compressed_frames
+        mode = replay.mode
+        data = _Unpacker.decompress(compressed)
+        row = [path.name, len(compressed),
+            bench(lambda: _Unpacker.decompress_play_data(compressed, mode))]
+        for compression in ["lzma", "none"]:
+            encoded = encode(data, compression=compression)
+            row += [len(encoded),
+                bench(lambda: decode_replay_data(encoded, mode))]
+        rows.append(row)
+
+    for (name, *results) in rows:
+        cells = []
+        for (size, seconds) in zip(results[0::2], results[1::2]):
+            cells += [f"{size / 1024:.1f}", f"{seconds * 1e3:.1f}"]
+        print(f"{name:<25}  " + "  ".join(f"{cell:>6}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
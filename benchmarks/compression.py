@@ -0,0 +1,35 @@
+"""
+Benchmarks compressing the replay data of each replay in ``tests/resources``
+with each of the lzma profiles in ``LZMA_PROFILES``, reporting compressed size
+against time.
+
+    $ python benchmarks/compression.py
+"""
+import time
+from pathlib import Path
+
+from osrparse import Replay
+from osrparse.replay import LZMA_PROFILES, _Packer
+
+RES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+def main():
+    print(f"{'replay':<30} {'profile':<8} {'size (KiB)':>11} {'time (ms)':>10}")
+    for path in sorted(RES.glob("*.osr")):
+        replay = Replay.from_path(path)
+        # make sure we're not timing decompression
+        replay.replay_data
+        for profile in LZMA_PROFILES:
+            packer = _Packer(replay, profile=profile)
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                data = packer.pack_replay_data()
+                times.append(time.perf_counter() - start)
+            print(f"{path.name:<30} {profile:<8} {len(data) / 1024:>11.1f} "
+                f"{min(times) * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmarks parsing the (already decompressed) replay data of each replay in
+``tests/resources``, into both ``ReplayEvent`` objects and, if numpy is
+installed, a columnar array.
+
+    $ python benchmarks/frames.py
+"""
+import lzma
+import timeit
+from pathlib import Path
+
+from osrparse import Replay, parse_replay_data
+
+try:
+    from osrparse.frames import parse_frames
+except ImportError:
+    parse_frames = None
+
+RES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+def bench(f):
+    (number, _total) = timeit.Timer(f).autorange()
+    times = timeit.Timer(f).repeat(repeat=5, number=number)
+    return min(times) / number
+
+
+def main():
+    print(f"{'replay':<30} {'frames':>8} {'events (ms)':>12} "
+        f"{'numpy (ms)':>12}")
+    for path in sorted(RES.glob("*.osr")):
+        replay = Replay.from_path(path)
+        data = lzma.decompress(replay._compressed_frames).decode("ascii")
+        mode = replay.mode
+
+        events = bench(lambda: parse_replay_data(data, decompressed=True,
+            mode=mode))
+        numpy = float("nan")
+        if parse_frames is not None:
+            numpy = bench(lambda: parse_frames(data, mode))
+        print(f"{path.name:<30} {len(replay.replay_data):>8} "
+            f"{events * 1e3:>12.2f} {numpy * 1e3:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
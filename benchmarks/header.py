@@ -0,0 +1,36 @@
+"""
+Benchmarks parsing and packing the header of each replay in
+``tests/resources``.
+
+Packing an untouched replay reuses its compressed replay data, so it measures
+the cost of packing the header.
+
+    $ python benchmarks/header.py
+"""
+import timeit
+from pathlib import Path
+
+from osrparse import Replay
+
+RES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+def bench(f):
+    (number, total) = timeit.Timer(f).autorange()
+    # take the best of a few runs to reduce noise
+    times = timeit.Timer(f).repeat(repeat=5, number=number)
+    return min(times) / number
+
+
+def main():
+    print(f"{'replay':<30} {'unpack (us)':>12} {'pack (us)':>12}")
+    for path in sorted(RES.glob("*.osr")):
+        data = path.read_bytes()
+        replay = Replay.from_string(data)
+        unpack = bench(lambda: Replay.from_string(data, frames=False))
+        pack = bench(replay.pack)
+        print(f"{path.name:<30} {unpack * 1e6:>12.2f} {pack * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Times each stage of parsing and packing a replay, for the replays in
+``tests/resources`` and for a long synthetic replay of each mode, and reports
+the peak memory allocated by each stage alongside its time.
+
+The stages are:
+
+* ``header``: parsing the header, skipping the replay data.
+* ``life_bar``: parsing the life bar.
+* ``decompress``: lzma decompressing the replay data.
+* ``tokenize``: splitting the replay data into columns of strings.
+* ``events``: building events from those columns.
+* ``parse``: all of the above, ie ``Replay.from_string`` and accessing
+  ``replay_data``.
+* ``format``: formatting events back into replay data text.
+* ``compress``: lzma compressing that text.
+* ``pack``: all of the above, ie ``Replay.pack``.
+
+The synthetic replays are built from the hypothesis strategies in
+``osrparse.strategies`` (which requires hypothesis), drawn deterministically
+so that results are comparable between runs. Their values are far more
+extreme than those of real replays, which makes them a stress test for
+formatting and parsing.
+
+Results can be written as json with ``--output``, and compared against an
+earlier run with ``--compare``:
+
+    $ python benchmarks/run.py --output before.json
+    $ git checkout my-branch
+    $ python benchmarks/run.py --compare before.json
+"""
+import argparse
+import json
+import lzma
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+from osrparse import Replay, GameMode, __version__
+from osrparse.replay import _Unpacker, _Packer
+
+RES = Path(__file__).parent.parent / "tests" / "resources"
+
+
+def bench(f, repeat):
+    (number, _total) = timeit.Timer(f).autorange()
+    # take the best of a few runs to reduce noise
+    times = timeit.Timer(f).repeat(repeat=repeat, number=number)
+    return min(times) / number
+
+
+def peak_memory(f):
+    tracemalloc.start()
+    try:
+        f()
+        (_current, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def stages(data):
+    # returns a dict of stage name to a function which runs that stage on the
+    # osr data `data`.
+    replay = Replay.from_string(data)
+    compressed = replay._compressed_frames
+    mode = replay.mode
+    text = _Unpacker.decompress(compressed)
+    (columns, _rng_seed) = _Unpacker.tokenize_replay_data(text)
+    replay.replay_data
+    packer = _Packer(replay, profile="default")
+    formatted = "".join(packer.iter_replay_data_text()).encode("ascii")
+
+    unpacker = _Unpacker(data)
+    unpacker.unpack_fields()
+    life_bar_offset = unpacker.offset
+
+    def life_bar():
+        unpacker.offset = life_bar_offset
+        unpacker.unpack_life_bar()
+
+    return {
+        "header": lambda: Replay.from_string(data, frames=False),
+        "life_bar": life_bar,
+        "decompress": lambda: _Unpacker.decompress(compressed),
+        "tokenize": lambda: _Unpacker.tokenize_replay_data(text),
+        "events": lambda: _Unpacker.build_events(columns, mode),
+        "parse": lambda: Replay.from_string(data).replay_data,
+        "format": lambda: "".join(packer.iter_replay_data_text()),
+        "compress": lambda: lzma.compress(formatted,
+            format=lzma.FORMAT_ALONE, filters=[packer.filter]),
+        "pack": lambda: replay.pack(profile="default")
+    }
+
+
+def examples(strategy, n):
+    # draws `n` examples from `strategy`, the same ones on every run
+    from hypothesis import given, settings, Phase, HealthCheck, Verbosity
+
+    drawn = []
+
+    @given(strategy)
+    @settings(database=None, max_examples=n, derandomize=True, deadline=None,
+        verbosity=Verbosity.quiet, phases=[Phase.generate],
+        suppress_health_check=list(HealthCheck))
+    def draw(example):
+        drawn.append(example)
+
+    draw()
+    return drawn
+
+
+def synthetic_replays(frames):
+    # returns the osr data of a synthetic replay with `frames` frames for each
+    # mode
+    from osrparse.strategies import (replays, replay_events_osu,
+        replay_events_taiko, replay_events_catch, replay_events_mania)
+
+    events = {
+        GameMode.STD: replay_events_osu,
+        GameMode.TAIKO: replay_events_taiko,
+        GameMode.CTB: replay_events_catch,
+        GameMode.MANIA: replay_events_mania
+    }
+    # only the replay data differs between modes
+    (replay,) = examples(replays(), 1)
+
+    datas = {}
+    for (mode, strategy) in events.items():
+        replay.mode = mode
+        # drawing every frame would take far too long, so repeat a pool of
+        # distinct frames instead.
+        pool = examples(strategy, 512)
+        replay.replay_data = (pool * (frames // len(pool) + 1))[:frames]
+        datas[f"synthetic_{mode.name.lower()}"] = replay.pack()
+    return datas
+
+
+def run(args):
+    datas = {path.name: path.read_bytes() for path in
+        sorted(RES.glob("*.osr"))}
+    if not args.no_synthetic:
+        datas.update(synthetic_replays(args.frames))
+
+    results = []
+    for (name, data) in datas.items():
+        replay = Replay.from_string(data)
+        for (stage, f) in stages(data).items():
+            if args.stages and stage not in args.stages:
+                continue
+            result = {
+                "replay": name,
+                "mode": replay.mode.name,
+                "frames": len(replay.replay_data),
+                "stage": stage,
+                "seconds": bench(f, args.repeat),
+                "peak_bytes": peak_memory(f)
+            }
+            results.append(result)
+            print(f"{name:<26} {stage:<10} {result['seconds'] * 1e3:>10.3f} "
+                f"ms {result['peak_bytes'] / 1024:>10.1f} KiB",
+                file=sys.stderr)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "osrparse": __version__,
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine()
+    }
+
+
+def compare(results, baseline, threshold):
+    # prints the change in time and memory of each (replay, stage) against
+    # `baseline`, and returns whether any stage got slower than `threshold`
+    before = {(r["replay"], r["stage"]): r for r in baseline["results"]}
+    regressed = False
+    print(f"{'replay':<26} {'stage':<10} {'time':>8} {'memory':>8}")
+    for r in results:
+        old = before.get((r["replay"], r["stage"]))
+        if old is None:
+            continue
+        time_ratio = r["seconds"] / old["seconds"]
+        memory_ratio = r["peak_bytes"] / max(old["peak_bytes"], 1)
+        flag = ""
+        if time_ratio > threshold:
+            flag = "  slower"
+            regressed = True
+        print(f"{r['replay']:<26} {r['stage']:<10} {time_ratio:>7.2f}x "
+            f"{memory_ratio:>7.2f}x{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the results to this json "
+        "file.")
+    parser.add_argument("--compare", help="Compare the results against "
+        "those in this json file, written by an earlier run.")
+    parser.add_argument("--threshold", type=float, default=1.1, help="How "
+        "much slower a stage can get before --compare reports it, as a "
+        "ratio. Defaults to 1.1. Exits with status 1 if any stage does.")
+    parser.add_argument("--frames", type=int, default=100_000, help="How "
+        "many frames each synthetic replay has. Defaults to 100000.")
+    parser.add_argument("--no-synthetic", action="store_true", help="Only "
+        "benchmark the replays in tests/resources.")
+    parser.add_argument("--stages", nargs="+", help="Only benchmark these "
+        "stages.")
+    parser.add_argument("--repeat", type=int, default=5, help="How many "
+        "times to time each stage, keeping the fastest. Defaults to 5.")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"metadata": metadata(), "results": results}, f,
+                indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
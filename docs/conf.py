@@ -55,6 +55,8 @@ rst_prolog = """
 .. |write_path| replace:: :func:`Replay.write_path() <osrparse.replay.Replay.write_path>`
 .. |write_file| replace:: :func:`Replay.write_file() <osrparse.replay.Replay.write_file>`
 .. |pack| replace:: :func:`Replay.pack() <osrparse.replay.Replay.pack>`
+.. |iter_frames| replace:: :func:`Replay.iter_frames() <osrparse.replay.Replay.iter_frames>`
+.. |frames_array| replace:: :func:`Replay.frames_array() <osrparse.replay.Replay.frames_array>`
 .. |parse_replay_data| replace:: :func:`parse_replay_data() <osrparse.replay.parse_replay_data>`
 
 .. |br| raw:: html
@@ -1,13 +1,45 @@
+import importlib
 from importlib import metadata
 
 from osrparse.utils import (GameMode, Mod, Key, ReplayEvent, ReplayEventOsu,
     ReplayEventTaiko, ReplayEventMania, ReplayEventCatch, KeyTaiko, KeyMania,
     LifeBarState)
-from osrparse.replay import Replay, parse_replay_data
+from osrparse.replay import (Replay, ReplayHeader, parse_replay_data,
+    iter_replay_data)
+from osrparse.batch import parse_many, write_many
+from osrparse.cache import ReplayCache, ReplayDataCache
+from osrparse.archive import ArchiveWriter, ArchiveReader
 
 __version__ = metadata.version(__package__)
 
 __all__ = ["GameMode", "Mod", "Replay", "ReplayEvent", "Key",
     "ReplayEventOsu", "ReplayEventTaiko", "ReplayEventMania",
     "ReplayEventCatch", "KeyTaiko", "KeyMania", "parse_replay_data",
-    "LifeBarState"]
+    "LifeBarState", "ReplayHeader", "iter_replay_data",
+    "parse_many", "write_many", "ReplayCache",
+    "ReplayDataCache", "ArchiveWriter", "ArchiveReader"]
+
+# the module of each attribute which is only imported when first accessed,
+# so that `import osrparse` doesn't pay for (or require) the modules they
+# need: sqlite3 for the index, and asyncio for the async api. These are left
+# out of `__all__`, so that `from osrparse import *` doesn't import them
+# either.
+_LAZY = {
+    "ReplayIndex": "osrparse.index",
+    "AsyncReplayParser": "osrparse.aio",
+    "afrom_path": "osrparse.aio",
+    "aparse_replay_data": "osrparse.aio",
+    "aparse_many": "osrparse.aio"
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_LAZY])
@@ -0,0 +1,3 @@
+from osrparse.cli import main
+
+main()
@@ -0,0 +1,196 @@
+import asyncio
+import os
+from functools import partial
+
+from osrparse.utils import GameMode
+from osrparse.replay import Replay, parse_replay_data
+from osrparse.batch import _expand_paths
+
+
+def _from_path(path, frames):
+    replay = Replay.from_path(path, frames=frames)
+    if frames:
+        # the replay data is decompressed lazily, which would otherwise
+        # happen on the event loop the first time it's accessed.
+        replay.replay_data
+    return replay
+
+
+class AsyncReplayParser:
+    """
+    Parses replays without blocking the event loop, by running the cpu bound
+    parts of parsing (reading files, lzma decompression, and parsing replay
+    data) in an executor.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+        The executor to parse in. Defaults to the event loop's default
+        executor (a thread pool). Parsing replay data holds the GIL, so a
+        ``ProcessPoolExecutor`` keeps the event loop much more responsive
+        under heavy load.
+    limit: int
+        The maximum number of replays to parse at once, across every call
+        on this parser. Further calls wait until a replay finishes parsing.
+        Defaults to the number of cpus.
+
+    Notes
+    -----
+    The functions ``afrom_path``, ``aparse_replay_data``, and ``aparse_many``
+    are shortcuts which create a parser for a single call. To limit
+    concurrency across calls, share a parser instead.
+    """
+    def __init__(self, executor=None, *, limit=None):
+        self.executor = executor
+        self.limit = limit or os.cpu_count() or 1
+        # created lazily, so that a parser can be created outside of an event
+        # loop.
+        self._semaphore = None
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def from_path(self, path, *, frames=True):
+        """
+        The asynchronous equivalent of ``Replay.from_path``.
+
+        Parameters
+        ----------
+        path: str or os.PathLike
+            The path to the osr file to read from.
+        frames: bool
+            Whether to parse the replay data. See ``Replay.from_path``.
+
+        Returns
+        -------
+        Replay or ReplayHeader
+            The parsed replay object, or its header if ``frames`` is ``False``.
+            Its replay data has already been parsed.
+        """
+        return await self._run(_from_path, path, frames)
+
+    async def parse_replay_data(self, data_string, *, decoded=False,
+        decompressed=False, mode=GameMode.STD):
+        """
+        The asynchronous equivalent of ``parse_replay_data``, which takes the
+        same arguments.
+
+        Returns
+        -------
+        List[ReplayEvent]
+            The parsed replay data.
+        """
+        fn = partial(parse_replay_data, decoded=decoded,
+            decompressed=decompressed, mode=mode)
+        return await self._run(fn, data_string)
+
+    async def parse_many(self, paths, *, ordered=True, frames=True):
+        """
+        The asynchronous equivalent of ``parse_many``. Only ``limit`` replays
+        are parsed ahead of the consumer, so a slow consumer slows down
+        parsing instead of letting parsed replays pile up in memory.
+
+        Parameters
+        ----------
+        paths: str or os.PathLike or Iterable or AsyncIterable
+            The paths to the osr files to parse. Directories are searched
+            recursively for ``.osr`` files. May also be an asynchronous
+            iterable of paths, such as one fed by a queue of uploads.
+        ordered: bool
+            Whether to yield results in the order of ``paths``. If ``False``,
+            results are yielded as soon as they are available instead.
+        frames: bool
+            Whether to parse the replay data. See ``Replay.from_path``.
+
+        Yields
+        ------
+        (path, Replay or ReplayHeader or Exception)
+            The path of each replay, and either the parsed replay or the
+            exception raised while parsing it.
+        """
+        if hasattr(paths, "__aiter__"):
+            paths = paths.__aiter__()
+            next_path = paths.__anext__
+        else:
+            # searching directories can take a while, so do it off the loop
+            loop = asyncio.get_running_loop()
+            paths = await loop.run_in_executor(None, list,
+                _expand_paths(paths))
+            paths = iter(paths)
+
+            async def next_path():
+                try:
+                    return next(paths)
+                except StopIteration:
+                    raise StopAsyncIteration from None
+
+        async def parse(path):
+            try:
+                return (path, await self.from_path(path, frames=frames))
+            except Exception as e:
+                return (path, e)
+
+        pending = []
+
+        async def refill():
+            while len(pending) < self.limit:
+                try:
+                    path = await next_path()
+                except StopAsyncIteration:
+                    return
+                pending.append(asyncio.ensure_future(parse(path)))
+
+        try:
+            await refill()
+            while pending:
+                if ordered:
+                    done = [pending.pop(0)]
+                    await done[0]
+                else:
+                    (done, _) = await asyncio.wait(pending,
+                        return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        pending.remove(task)
+                for task in done:
+                    yield task.result()
+                await refill()
+        finally:
+            # if the consumer stops early, don't parse replays nobody will see
+            for task in pending:
+                task.cancel()
+
+
+async def afrom_path(path, *, frames=True, executor=None):
+    """
+    The asynchronous equivalent of ``Replay.from_path``. See
+    ``AsyncReplayParser.from_path``.
+    """
+    parser = AsyncReplayParser(executor)
+    return await parser.from_path(path, frames=frames)
+
+
+async def aparse_replay_data(data_string, *, decoded=False,
+    decompressed=False, mode=GameMode.STD, executor=None):
+    """
+    The asynchronous equivalent of ``parse_replay_data``. See
+    ``AsyncReplayParser.parse_replay_data``.
+    """
+    parser = AsyncReplayParser(executor)
+    return await parser.parse_replay_data(data_string, decoded=decoded,
+        decompressed=decompressed, mode=mode)
+
+
+async def aparse_many(paths, *, ordered=True, frames=True, executor=None,
+    limit=None):
+    """
+    The asynchronous equivalent of ``parse_many``. See
+    ``AsyncReplayParser.parse_many``.
+    """
+    parser = AsyncReplayParser(executor, limit=limit)
+    async for result in parser.parse_many(paths, ordered=ordered,
+        frames=frames):
+        yield result
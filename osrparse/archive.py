@@ -0,0 +1,255 @@
+import lzma
+import struct
+from collections import defaultdict
+
+from osrparse.replay import Replay, ReplayHeader, _Unpacker, _BYTE
+from osrparse.cache import (_pack_record, _unpack_record, _pack_columns,
+    _unpack_columns)
+
+ARCHIVE_VERSION = 1
+_MAGIC = b"OSRA"
+# index offset, index length, number of replays
+_FOOTER = struct.Struct("<qqq")
+# offset and length of a frame block
+_BLOCK = struct.Struct("<qq")
+# the replay data of a replay is already binary columns, so lzma's literal
+# context is of no use to it. Raw lzma2 streams also avoid the header of the
+# lzma format used by osr files. Delta coding the columns (with
+# `lzma.FILTER_DELTA`, or by differencing values) makes every column compress
+# worse: time_delta is already a difference, keys are states rather than
+# counts, and the low bits of cursor positions barely correlate between
+# frames.
+_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+
+
+class ArchiveWriter:
+    """
+    Writes many replays to a single archive file, to be read with
+    ``ArchiveReader``.
+
+    Parameters
+    ----------
+    file: str or os.PathLike or file-like
+        The path to write the archive to, or an open file object to write it
+        to. The file does not need to be seekable.
+
+    Notes
+    -----
+    An archive is a frame block for each replay, followed by an index of
+    every replay's header. The replay data of each replay is stored as binary
+    columns (one per attribute of its events, little endian regardless of the
+    platform) compressed with raw lzma2, which is smaller than the lzma
+    compressed text of an osr file, and much faster to read back, since there
+    is no text to parse.
+
+    Use as a context manager, or call ``close`` once all replays have been
+    added; the archive is unreadable until then.
+    """
+    def __init__(self, file):
+        self._owns_file = not hasattr(file, "write")
+        self.file = open(file, "wb") if self._owns_file else file
+        self._index = []
+        self._offset = 0
+        self._write(_MAGIC + _BYTE.pack(ARCHIVE_VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def _write(self, data):
+        self.file.write(data)
+        self._offset += len(data)
+
+    def add(self, replay):
+        """
+        Adds a replay to the archive.
+
+        Parameters
+        ----------
+        replay: Replay
+            The replay to add.
+        """
+        block = lzma.compress(_pack_columns(replay, little_endian=True),
+            format=lzma.FORMAT_RAW, filters=_FILTERS)
+        self._index.append(_pack_record(replay) +
+            _BLOCK.pack(self._offset, len(block)))
+        self._write(block)
+
+    def close(self):
+        """
+        Writes the index of the archive, and closes the file if it was opened
+        by this writer.
+        """
+        if self._index is None:
+            return
+        index = lzma.compress(b"".join(self._index), format=lzma.FORMAT_RAW,
+            filters=_FILTERS)
+        index_offset = self._offset
+        self._write(index)
+        self._write(_FOOTER.pack(index_offset, len(index), len(self._index)))
+        self._write(_MAGIC)
+        self._index = None
+        if self._owns_file:
+            self.file.close()
+
+
+class _Entry:
+    __slots__ = ("header", "record_offset", "block_offset", "block_length")
+
+    def __init__(self, header, record_offset, block_offset, block_length):
+        self.header = header
+        self.record_offset = record_offset
+        self.block_offset = block_offset
+        self.block_length = block_length
+
+
+class ArchiveReader:
+    """
+    Reads replays from an archive written by ``ArchiveWriter``. Only the index
+    of the archive is read up front; each replay is read from disk when it is
+    accessed.
+
+    Parameters
+    ----------
+    file: str or os.PathLike or file-like
+        The path to the archive to read, or an open (seekable) file object to
+        read it from.
+
+    Attributes
+    ----------
+    headers: List[ReplayHeader]
+        The header of every replay in the archive, in the order they were
+        added.
+
+    Notes
+    -----
+    An archive supports ``len``, indexing (``archive[i]`` is the ``i``-th
+    replay added to it), and iteration over its replays. Use as a context
+    manager, or call ``close`` when done.
+    """
+    def __init__(self, file):
+        self._owns_file = not hasattr(file, "read")
+        self.file = open(file, "rb") if self._owns_file else file
+        try:
+            self._read_index()
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def _read_index(self):
+        f = self.file
+        f.seek(0)
+        if f.read(len(_MAGIC) + 1) != _MAGIC + _BYTE.pack(ARCHIVE_VERSION):
+            raise ValueError("Not a replay archive, or an archive from a "
+                "different version of osrparse")
+        f.seek(-(_FOOTER.size + len(_MAGIC)), 2)
+        footer = f.read(_FOOTER.size + len(_MAGIC))
+        if footer[_FOOTER.size:] != _MAGIC:
+            raise ValueError("Replay archive is truncated or was not closed")
+        (index_offset, index_length, count) = _FOOTER.unpack_from(footer)
+        f.seek(index_offset)
+        self._index = lzma.decompress(f.read(index_length),
+            format=lzma.FORMAT_RAW, filters=_FILTERS)
+
+        self._entries = []
+        self._by_replay_hash = {}
+        self._by_beatmap_hash = defaultdict(list)
+        unpacker = _Unpacker(self._index)
+        try:
+            for i in range(count):
+                record_offset = unpacker.offset
+                (fields, _life_bar_graph, timestamp, replay_id, _rng_seed,
+                    _length) = _unpack_record(unpacker)
+                (block_offset, block_length) = unpacker.unpack_struct(_BLOCK)
+                header = ReplayHeader(*fields, timestamp, replay_id)
+                self._entries.append(_Entry(header, record_offset,
+                    block_offset, block_length))
+                self._by_replay_hash.setdefault(header.replay_hash, i)
+                self._by_beatmap_hash[header.beatmap_hash].append(i)
+        finally:
+            unpacker.release()
+        self.headers = [entry.header for entry in self._entries]
+
+    def close(self):
+        """
+        Closes the file if it was opened by this reader.
+        """
+        if self._owns_file:
+            self.file.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, i):
+        entry = self._entries[i]
+        self.file.seek(entry.block_offset)
+        block = lzma.decompress(self.file.read(entry.block_length),
+            format=lzma.FORMAT_RAW, filters=_FILTERS)
+
+        unpacker = _Unpacker(self._index)
+        try:
+            unpacker.offset = entry.record_offset
+            (fields, life_bar_graph, timestamp, replay_id, rng_seed,
+                length) = _unpack_record(unpacker)
+        finally:
+            unpacker.release()
+        unpacker = _Unpacker(block)
+        try:
+            replay_data = _unpack_columns(unpacker, fields[0], length,
+                little_endian=True)
+        finally:
+            unpacker.release()
+
+        return Replay(*fields, life_bar_graph, timestamp, replay_data,
+            replay_id, rng_seed)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def by_replay_hash(self, replay_hash):
+        """
+        Returns the replay with the given ``replay_hash``.
+
+        Parameters
+        ----------
+        replay_hash: str
+            The hash of the replay to read.
+
+        Returns
+        -------
+        Replay
+            The replay with this hash. If the archive holds several replays
+            with this hash, the first one added is returned.
+
+        Raises
+        ------
+        KeyError
+            If no replay in the archive has this hash.
+        """
+        return self[self._by_replay_hash[replay_hash]]
+
+    def by_beatmap_hash(self, beatmap_hash):
+        """
+        Returns every replay played on the beatmap with the given
+        ``beatmap_hash``.
+
+        Parameters
+        ----------
+        beatmap_hash: str
+            The hash of the beatmap.
+
+        Returns
+        -------
+        List[Replay]
+            The replays played on this beatmap, in the order they were added.
+        """
+        return [self[i] for i in self._by_beatmap_hash.get(beatmap_hash, [])]
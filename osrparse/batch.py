@@ -0,0 +1,209 @@
+import os
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor, wait,
+    FIRST_COMPLETED)
+from collections import deque
+from functools import partial
+from itertools import islice
+from pathlib import Path
+
+from osrparse.replay import Replay
+
+EXECUTORS = {
+    "process": ProcessPoolExecutor,
+    "thread": ThreadPoolExecutor
+}
+
+
+def _expand_paths(paths):
+    # a single path, or any directories among the paths, are expanded to the
+    # osr files they contain.
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(Path(path).rglob("*.osr"))
+        else:
+            yield path
+
+
+def _parse_chunk(paths, *, frames, mmap, transform, cache, lazy):
+    results = []
+    for path in paths:
+        # one corrupt replay shouldn't take the rest of the batch down with it
+        try:
+            if cache is not None and frames:
+                result = cache.from_path(path)
+            else:
+                result = Replay.from_path(path, frames=frames, mmap=mmap)
+            if transform is not None:
+                result = transform(result)
+            elif frames and not lazy:
+                # the replay data is decompressed lazily, which would
+                # otherwise happen in the consuming process, one replay at a
+                # time, and raise any error there.
+                result.replay_data
+        except Exception as e:
+            result = e
+        results.append((path, result))
+    return results
+
+
+def _run_chunks(fn, items, *, workers, executor, chunksize, ordered):
+    # runs `fn` over chunks of `items` in an executor, and yields the items of
+    # the lists it returns. Only a bounded number of chunks are in flight at
+    # once, so `items` can be a lazy iterable of any length.
+    if executor not in EXECUTORS:
+        raise ValueError(f"Expected executor to be one of {list(EXECUTORS)}, "
+            f"got {executor!r}")
+    workers = workers or os.cpu_count() or 1
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunksize)), [])
+
+    with EXECUTORS[executor](workers) as pool:
+        pending = deque()
+        try:
+            for chunk in islice(chunks, workers * 2):
+                pending.append(pool.submit(fn, chunk))
+
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+
+                for future in done:
+                    for chunk in islice(chunks, 1):
+                        pending.append(pool.submit(fn, chunk))
+                    yield from future.result()
+        finally:
+            # if the consumer stops early, don't run chunks nobody will see
+            for future in pending:
+                future.cancel()
+
+
+def parse_many(paths, *, workers=None, executor="process", ordered=True,
+    chunksize=16, frames=True, mmap=False, transform=None, cache=None,
+    lazy=False):
+    """
+    Parses many replays in parallel.
+
+    Parameters
+    ----------
+    paths: str or os.PathLike or Iterable[str or os.PathLike]
+        The paths to the osr files to parse. Directories are searched
+        recursively for ``.osr`` files. May be a lazy iterable.
+    workers: int
+        How many workers to parse with. Defaults to the number of cpus.
+    executor: str
+        Whether to parse in a pool of processes (``"process"``) or threads
+        (``"thread"``).
+    ordered: bool
+        Whether to yield results in the order of ``paths``. If ``False``,
+        results are yielded as soon as they are available instead.
+    chunksize: int
+        How many replays each worker parses per task. Larger chunks reduce
+        scheduling overhead.
+    frames: bool
+        Whether to parse the replay data. If ``False``, a ``ReplayHeader`` is
+        returned for each replay instead. See |from_path|.
+    mmap: bool
+        Whether to memory map each file instead of reading it. See
+        |from_path|.
+    transform: Callable
+        If passed, called on each parsed replay in the worker, and its return
+        value is yielded instead of the replay. Must be picklable if
+        ``executor`` is ``"process"``.
+    cache: ReplayCache
+        If passed, replays are loaded through this cache (see
+        ``osrparse.cache.ReplayCache``). Ignored if ``frames`` is ``False``.
+    lazy: bool
+        Whether to send replays back with their replay data still compressed,
+        instead of parsing it in the worker. See the notes below.
+
+    Yields
+    ------
+    (path, Any or Exception)
+        The path of each replay, and either the parsed replay (or the result
+        of ``transform``) or the exception raised while parsing it.
+
+    Notes
+    -----
+    By default, the replay data of each replay is parsed in the worker, so
+    parsing happens in parallel and a replay with corrupt replay data is
+    reported as an exception like any other. Sending every event back from a
+    worker process is expensive, though. There are two ways around this:
+
+    * pass a ``transform`` which returns a compact result, for instance
+      ``Replay.frames_array``. The replay data is then only parsed if the
+      transform accesses it.
+    * pass ``lazy=True`` to send replays back with their replay data still
+      compressed (see |Replay|), which is cheap to transfer. The replay data
+      is then decompressed in the consuming process once it is accessed, and
+      any error in it is only raised then. Useful when the replay data is
+      never accessed, for instance when only rewriting headers.
+    """
+    fn = partial(_parse_chunk, frames=frames, mmap=mmap, transform=transform,
+        cache=cache, lazy=lazy)
+    yield from _run_chunks(fn, _expand_paths(paths), workers=workers,
+        executor=executor, chunksize=chunksize, ordered=ordered)
+
+
+def _write_chunk(items, *, dict_size, mode, profile):
+    results = []
+    for (replay, path) in items:
+        try:
+            replay.write_path(path, dict_size=dict_size, mode=mode,
+                profile=profile)
+            error = None
+        except Exception as e:
+            error = e
+        results.append((path, error))
+    return results
+
+
+def write_many(items, *, workers=None, executor="process", ordered=True,
+    chunksize=4, dict_size=None, mode=None, profile=None):
+    """
+    Writes many replays in parallel. Compressing replay data is cpu bound, so
+    this is much faster than writing replays one at a time.
+
+    Parameters
+    ----------
+    items: Iterable[(Replay, str or os.PathLike)]
+        The replays to write, and the path to write each one to. May be a lazy
+        iterable; only a bounded number of replays are in flight at once.
+    workers: int
+        How many workers to write with. Defaults to the number of cpus.
+    executor: str
+        Whether to write in a pool of processes (``"process"``) or threads
+        (``"thread"``).
+    ordered: bool
+        Whether to yield results in the order of ``items``. If ``False``,
+        results are yielded as soon as they are available instead.
+    chunksize: int
+        How many replays each worker writes per task.
+    dict_size: int
+        See |write_path|.
+    mode: int
+        See |write_path|.
+    profile: str
+        See |write_path|.
+
+    Yields
+    ------
+    (path, Optional[Exception])
+        The path of each replay, and the exception raised while writing it, or
+        ``None`` if it was written successfully.
+
+    Notes
+    -----
+    Replays whose replay data was never accessed are sent to worker processes
+    with their replay data still compressed, and unless lzma settings are
+    passed, are written without being recompressed at all.
+    """
+    fn = partial(_write_chunk, dict_size=dict_size, mode=mode,
+        profile=profile)
+    yield from _run_chunks(fn, items, workers=workers, executor=executor,
+        chunksize=chunksize, ordered=ordered)
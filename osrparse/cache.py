@@ -0,0 +1,438 @@
+import os
+import sys
+import struct
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from hashlib import blake2b
+from pathlib import Path
+
+from osrparse.utils import GameMode
+from osrparse.replay import Replay, _Unpacker, _Packer, _BYTE
+from osrparse.codec import _to_le
+
+# bump whenever the entry format changes, so that stale entries are never read
+CACHE_VERSION = 1
+_MAGIC = b"OSRC"
+_SUFFIX = ".osrc"
+
+# the array typecode of each column of the replay data (time_delta, x, y,
+# keys) for each mode, or None if that mode doesn't use the column. These are
+# laid out like the columns of `_Unpacker.tokenize_replay_data`, so that
+# `_Unpacker.build_events` can build events from them directly.
+_COLUMNS = {
+    GameMode.STD: ("q", "d", "d", "i"),
+    GameMode.TAIKO: ("q", "q", None, "i"),
+    GameMode.CTB: ("q", "d", None, "B"),
+    # mania stores its keys in the x column
+    GameMode.MANIA: ("q", "i", None, None)
+}
+
+
+def _event_columns(events, mode):
+    if mode is GameMode.STD:
+        columns = ([e.time_delta for e in events], [e.x for e in events],
+            [e.y for e in events], [e.keys for e in events])
+    if mode is GameMode.TAIKO:
+        columns = ([e.time_delta for e in events], [e.x for e in events],
+            None, [e.keys for e in events])
+    if mode is GameMode.CTB:
+        columns = ([e.time_delta for e in events], [e.x for e in events],
+            None, [e.dashing for e in events])
+    if mode is GameMode.MANIA:
+        columns = ([e.time_delta for e in events], [e.keys for e in events],
+            None, None)
+    return [None if column is None else array(code, column)
+        for (code, column) in zip(_COLUMNS[mode], columns)]
+
+
+def _pack_record(replay):
+    # every attribute of a replay except its replay data, followed by the
+    # number of frames in its replay data.
+    packer = _Packer(replay)
+    rng_seed = replay.rng_seed
+    return b"".join([
+        packer.pack_header(),
+        packer.pack_long(replay.replay_id),
+        packer.pack_byte(rng_seed is not None),
+        packer.pack_long(rng_seed or 0),
+        packer.pack_long(len(replay.replay_data))
+    ])
+
+
+def _unpack_record(unpacker):
+    fields = unpacker.unpack_fields()
+    life_bar_graph = unpacker.unpack_life_bar()
+    timestamp = unpacker.unpack_timestamp()
+    replay_id = unpacker.unpack_long()
+    has_rng_seed = unpacker.unpack_byte()
+    rng_seed = unpacker.unpack_long()
+    if not has_rng_seed:
+        rng_seed = None
+    length = unpacker.unpack_long()
+    return (fields, life_bar_graph, timestamp, replay_id, rng_seed, length)
+
+
+# the size of each typecode in `_COLUMNS`, for layouts which must not depend
+# on the platform
+_ITEMSIZES = {"q": 8, "d": 8, "i": 4, "B": 1}
+
+
+def _check_itemsize(column):
+    if column.itemsize != _ITEMSIZES[column.typecode]:
+        raise ValueError(f"Expected arrays of typecode {column.typecode!r} "
+            f"to be {_ITEMSIZES[column.typecode]} bytes on this platform, "
+            f"not {column.itemsize}")
+
+
+def _pack_columns(replay, *, little_endian=False):
+    # columns are in native byte order, unless `little_endian` is set, for
+    # data which is read back on other machines.
+    columns = _event_columns(replay.replay_data, replay.mode)
+    data = []
+    for column in columns:
+        if column is None:
+            continue
+        if little_endian:
+            _check_itemsize(column)
+            _to_le(column)
+        data.append(column.tobytes())
+    return b"".join(data)
+
+
+def _unpack_columns(unpacker, mode, length, *, little_endian=False):
+    columns = []
+    for code in _COLUMNS[mode]:
+        if code is None:
+            columns.append(())
+            continue
+        column = array(code)
+        if little_endian:
+            _check_itemsize(column)
+        end = unpacker.offset + length * column.itemsize
+        column.frombytes(unpacker.replay_data[unpacker.offset:end])
+        if len(column) != length:
+            raise ValueError("Unexpected end of replay data columns")
+        if little_endian:
+            _to_le(column)
+        unpacker.offset = end
+        columns.append(column)
+    return _Unpacker.build_events(columns, mode)
+
+
+def _pack_entry(replay):
+    return b"".join([
+        _MAGIC,
+        _BYTE.pack(CACHE_VERSION),
+        _pack_record(replay),
+        _pack_columns(replay)
+    ])
+
+
+def _unpack_entry(data):
+    if data[:len(_MAGIC)] != _MAGIC or data[len(_MAGIC)] != CACHE_VERSION:
+        raise ValueError("Not a replay cache entry, or an entry from a "
+            "different version of osrparse")
+    unpacker = _Unpacker(data)
+    try:
+        unpacker.offset = len(_MAGIC) + _BYTE.size
+        (fields, life_bar_graph, timestamp, replay_id, rng_seed,
+            length) = _unpack_record(unpacker)
+        replay_data = _unpack_columns(unpacker, fields[0], length)
+    finally:
+        unpacker.release()
+
+    return Replay(*fields, life_bar_graph, timestamp, replay_data, replay_id,
+        rng_seed)
+
+
+class ReplayCache:
+    """
+    An on-disk cache of parsed replays. Loading a replay from the cache skips
+    decompressing and parsing its replay data entirely, which makes up almost
+    all of the time spent parsing a replay.
+
+    Parameters
+    ----------
+    directory: str or os.PathLike
+        The directory to store cached replays in. Created if it doesn't exist.
+        May be shared between processes.
+    max_bytes: int
+        The maximum total size of the cache. Once exceeded, the least recently
+        used replays are evicted.
+    key: str
+        How to tell whether a file has changed since it was cached. If
+        ``"stat"``, a file is keyed by its path, size, and modification time,
+        which doesn't require reading the file at all on a hit. If
+        ``"content"``, a file is keyed by a hash of its contents, which is
+        robust to files being moved or copied, but requires reading the file.
+
+    Attributes
+    ----------
+    hits: int
+        How many replays were loaded from the cache.
+    misses: int
+        How many replays were parsed because they weren't in the cache.
+
+    Notes
+    -----
+    Entries are stored as a header record followed by the replay data in
+    binary columns, in native byte order. Entries are written atomically, so
+    a cache can be used from many processes at once (for instance, by passing
+    it to ``parse_many``).
+    """
+    def __init__(self, directory, *, max_bytes=1 << 30, key="stat"):
+        if key not in ["stat", "content"]:
+            raise ValueError("Expected key to be one of ['stat', 'content'], "
+                f"got {key!r}")
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        # an estimate of the size of the cache, so that we don't have to scan
+        # the directory on every write. None until first needed.
+        self._size = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __getstate__(self):
+        # the counters and size estimate are per process
+        state = self.__dict__.copy()
+        state.update(hits=0, misses=0, _size=None)
+        return state
+
+    def _entry_path(self, material):
+        h = blake2b(digest_size=20)
+        h.update(f"{CACHE_VERSION}|{sys.byteorder}|{self.key}|".encode())
+        h.update(material)
+        return self.directory / (h.hexdigest() + _SUFFIX)
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # evicted by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _load(self, entry_path):
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            replay = _unpack_entry(data)
+        except (ValueError, IndexError, KeyError, struct.error):
+            # a corrupt entry is just a miss
+            self._remove(entry_path)
+            return None
+        # bump the entry to most recently used
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+        return replay
+
+    def _store(self, entry_path, replay):
+        try:
+            data = _pack_entry(replay)
+        except OverflowError:
+            # some value doesn't fit in its column. Not worth caching.
+            return
+
+        (fd, tmp_path) = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        if self._size is None:
+            self._size = sum(size for (_, size, _) in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def from_path(self, path):
+        """
+        Equivalent to ``Replay.from_path(path)``, but loads the replay from
+        the cache if possible, and caches it otherwise.
+
+        Parameters
+        ----------
+        path: str or os.PathLike
+            The path to the osr file to read from.
+
+        Returns
+        -------
+        Replay
+            The parsed replay object.
+        """
+        data = None
+        if self.key == "stat":
+            stat = os.stat(path)
+            material = (f"{os.path.abspath(path)}|{stat.st_size}|"
+                f"{stat.st_mtime_ns}").encode()
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+            material = data
+        entry_path = self._entry_path(material)
+
+        replay = self._load(entry_path)
+        if replay is not None:
+            self.hits += 1
+            return replay
+
+        self.misses += 1
+        if data is None:
+            replay = Replay.from_path(path)
+        else:
+            replay = Replay.from_string(data)
+        self._store(entry_path, replay)
+        return replay
+
+    def evict(self):
+        """
+        Evicts the least recently used replays until the cache is at most
+        ``max_bytes`` large.
+        """
+        entries = sorted(self._entries())
+        size = sum(size for (_, size, _) in entries)
+        for (_, entry_size, entry_path) in entries:
+            if size <= self.max_bytes:
+                break
+            self._remove(entry_path)
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        """
+        Removes every replay from the cache.
+        """
+        for (_, _, entry_path) in self._entries():
+            self._remove(entry_path)
+        self._size = 0
+
+
+class ReplayDataCache:
+    """
+    An in-memory, least recently used cache of parsed replay data, for
+    services which parse the same replay data (for instance, responses from
+    api v1's ``/get_replay`` endpoint) repeatedly. Pass it as the ``cache``
+    argument of ``parse_replay_data``.
+
+    Parameters
+    ----------
+    max_entries: int
+        The maximum number of replays to keep parsed replay data for.
+    max_bytes: int
+        The maximum (approximate) amount of memory the parsed replay data may
+        take up.
+
+    Attributes
+    ----------
+    hits: int
+        How many lookups were answered from the cache.
+    misses: int
+        How many lookups had to parse their replay data.
+    size: int
+        The approximate amount of memory the cached replay data takes up.
+
+    Notes
+    -----
+    Replay data is keyed by a digest of the data passed to
+    ``parse_replay_data``, and cached as binary columns (one per attribute of
+    its events) rather than as events. Every lookup builds new events from
+    those columns, so callers can modify the replay data they get back
+    without affecting each other or the cache, and the size of an entry is
+    exactly the size of its columns. A cache is safe to use from multiple
+    threads.
+    """
+    def __init__(self, *, max_entries=1024, max_bytes=256 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        # digest -> (columns, size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _digest(key):
+        (data, decoded, decompressed, mode) = key
+        if isinstance(data, str):
+            data = data.encode("ascii")
+        h = blake2b(data, digest_size=16)
+        h.update(bytes([decoded, decompressed, mode.value]))
+        return h.digest()
+
+    @staticmethod
+    def _sizeof(columns):
+        return sum(sys.getsizeof(column) for column in columns)
+
+    def _get(self, key, parse):
+        mode = key[3]
+        digest = self._digest(key)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+        if entry is not None:
+            # new events on every hit, built outside the lock
+            return _Unpacker.build_events(entry[0], mode)
+
+        # parse outside the lock, so that other threads aren't blocked on it.
+        # Two threads may parse the same replay data at once; the second
+        # result simply replaces the first.
+        replay_data = parse()
+        try:
+            columns = [() if column is None else column for column in
+                _event_columns(replay_data, mode)]
+        except OverflowError:
+            # some value doesn't fit in its column. Not worth caching.
+            return replay_data
+        size = self._sizeof(columns)
+        with self._lock:
+            old = self._entries.pop(digest, None)
+            if old is not None:
+                self.size -= old[1]
+            if size <= self.max_bytes:
+                self._entries[digest] = (columns, size)
+                self.size += size
+            while (len(self._entries) > self.max_entries or
+                self.size > self.max_bytes):
+                (_, (_, evicted_size)) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+        return replay_data
+
+    def clear(self):
+        """
+        Removes all replay data from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
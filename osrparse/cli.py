@@ -0,0 +1,278 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from osrparse.utils import GameMode
+from osrparse.replay import Replay, LZMA_PROFILES
+from osrparse.batch import parse_many, write_many, _expand_paths
+from osrparse.index import ReplayIndex
+
+_HEADER_FIELDS = ["path", "mode", "game_version", "beatmap_hash", "username",
+    "replay_hash", "count_300", "count_100", "count_50", "count_geki",
+    "count_katu", "count_miss", "score", "max_combo", "perfect", "mods",
+    "timestamp", "replay_id"]
+_FRAME_FIELDS = ["path", "time", "time_delta", "x", "y", "keys"]
+
+
+def _header_row(path, header):
+    row = {"path": str(path)}
+    row.update((name, getattr(header, name)) for name in _HEADER_FIELDS[1:])
+    row["mode"] = header.mode.value
+    row["mods"] = int(header.mods)
+    row["perfect"] = int(header.perfect)
+    row["timestamp"] = header.timestamp.isoformat()
+    return row
+
+
+def _frame_rows(replay):
+    # runs in the workers, so that decompressing and parsing the replay data
+    # happens in parallel. Plain tuples are much cheaper to send back than
+    # events.
+    mode = replay.mode
+    time_ = 0
+    rows = []
+    for e in replay.replay_data:
+        time_ += e.time_delta
+        if mode is GameMode.STD:
+            rows.append((time_, e.time_delta, e.x, e.y, int(e.keys)))
+        if mode is GameMode.TAIKO:
+            rows.append((time_, e.time_delta, e.x, None, int(e.keys)))
+        if mode is GameMode.CTB:
+            rows.append((time_, e.time_delta, e.x, None, int(e.dashing)))
+        if mode is GameMode.MANIA:
+            rows.append((time_, e.time_delta, None, None, int(e.keys)))
+    return rows
+
+
+def _count_frames(replay):
+    return len(replay.replay_data)
+
+
+class _RowWriter:
+    # writes rows of a fixed set of fields as either json lines or csv
+    def __init__(self, file, fields, format_):
+        self.file = file
+        self.fields = fields
+        self.format = format_
+        if format_ == "csv":
+            self.writer = csv.writer(file)
+            self.writer.writerow(fields)
+
+    def write(self, row):
+        if self.format == "csv":
+            self.writer.writerow([row[field] for field in self.fields])
+        else:
+            self.file.write(json.dumps(row) + "\n")
+
+
+def _report_error(path, error):
+    print(f"{path}: {error}", file=sys.stderr)
+
+
+def _dump(args):
+    out = sys.stdout
+    if args.output is not None:
+        out = open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        if args.frames:
+            writer = _RowWriter(out, _FRAME_FIELDS, args.format)
+            results = parse_many(args.paths, workers=args.workers,
+                transform=_frame_rows)
+            for (path, rows) in results:
+                if isinstance(rows, Exception):
+                    _report_error(path, rows)
+                    continue
+                path = str(path)
+                for (time_, time_delta, x, y, keys) in rows:
+                    writer.write({"path": path, "time": time_,
+                        "time_delta": time_delta, "x": x, "y": y,
+                        "keys": keys})
+        else:
+            writer = _RowWriter(out, _HEADER_FIELDS, args.format)
+            results = parse_many(args.paths, workers=args.workers,
+                frames=False, mmap=True)
+            for (path, header) in results:
+                if isinstance(header, Exception):
+                    _report_error(path, header)
+                    continue
+                writer.write(_header_row(path, header))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def _convert(args):
+    output = Path(args.output)
+
+    def items():
+        for root in args.paths:
+            root = Path(root)
+            for path in _expand_paths([root]):
+                path = Path(path)
+                relative = path.relative_to(root) if root.is_dir() else (
+                    Path(path.name))
+                destination = output / relative
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    # only the header is parsed here. The replay data is
+                    # decompressed and recompressed in the workers.
+                    replay = Replay.from_path(path)
+                except Exception as e:
+                    _report_error(path, e)
+                    continue
+                yield (replay, destination)
+
+    written = 0
+    for (path, error) in write_many(items(), workers=args.workers,
+        profile=args.profile, dict_size=args.dict_size):
+        if error is not None:
+            _report_error(path, error)
+            continue
+        written += 1
+    print(f"converted {written} replays", file=sys.stderr)
+
+
+def _stat(args):
+    count = 0
+    failed = 0
+    size = 0
+    modes = Counter()
+    mods = Counter()
+    beatmaps = set()
+    users = set()
+    timestamps = []
+    for (path, header) in parse_many(args.paths, workers=args.workers,
+        frames=False, mmap=True):
+        if isinstance(header, Exception):
+            _report_error(path, header)
+            failed += 1
+            continue
+        count += 1
+        size += os.path.getsize(path)
+        modes[header.mode.name] += 1
+        mods[header.mods] += 1
+        beatmaps.add(header.beatmap_hash)
+        users.add(header.username)
+        timestamps.append(header.timestamp)
+
+    print(f"replays:  {count} ({failed} failed)")
+    print(f"size:     {size / 1024**2:.1f} MiB")
+    print(f"beatmaps: {len(beatmaps)}")
+    print(f"users:    {len(users)}")
+    if timestamps:
+        print(f"played:   {min(timestamps):%Y-%m-%d} to "
+            f"{max(timestamps):%Y-%m-%d}")
+    print("modes:    " + ", ".join(f"{mode} {n}" for (mode, n) in
+        modes.most_common()))
+    print("mods:     " + ", ".join(f"{mod.name or int(mod)} {n}" for (mod, n)
+        in mods.most_common(10)))
+
+
+def _bench(args):
+    paths = [str(path) for path in _expand_paths(args.paths)]
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"{len(paths)} replays, {size / 1024**2:.1f} MiB, "
+        f"{args.workers or os.cpu_count()} workers")
+    for (name, kwargs) in [("header", {"frames": False, "mmap": True}),
+        ("full", {"transform": _count_frames})]:
+        start = time.perf_counter()
+        frames = 0
+        for (_path, result) in parse_many(paths, workers=args.workers,
+            **kwargs):
+            if isinstance(result, int):
+                frames += result
+        elapsed = time.perf_counter() - start
+        line = (f"{name:<7} {elapsed:8.2f}s  {len(paths) / elapsed:10.1f} "
+            f"replays/s  {size / 1024**2 / elapsed:8.1f} MiB/s")
+        if frames:
+            line += f"  {frames / elapsed:12.0f} frames/s"
+        print(line)
+
+
+def _index(args):
+    with ReplayIndex(args.database) as index:
+        result = index.update(args.paths, workers=args.workers,
+            prune=not args.no_prune)
+        print(f"added {result.added}, updated {result.updated}, removed "
+            f"{result.removed}, unchanged {result.unchanged}, failed "
+            f"{len(result.errors)} ({len(index)} replays indexed)")
+    for (path, error) in result.errors:
+        _report_error(path, error)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog="osrparse",
+        description="Tools for working with osu! replays.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, func, help_):
+        command = subparsers.add_parser(name, help=help_, description=help_)
+        command.add_argument("--workers", type=int, help="How many processes "
+            "to work with. Defaults to the number of cpus.")
+        command.set_defaults(func=func)
+        return command
+
+    def add_paths(command, help_="The osr files, or directories of osr "
+        "files, to read."):
+        command.add_argument("paths", nargs="+", help=help_)
+
+    dump = add_command("dump", _dump, "Write the headers (or replay data) "
+        "of replays as json lines or csv.")
+    add_paths(dump)
+    dump.add_argument("--frames", action="store_true", help="Write one row "
+        "per frame instead of one row per replay.")
+    dump.add_argument("--format", choices=["jsonl", "csv"], default="jsonl",
+        help="The format to write. Defaults to jsonl.")
+    dump.add_argument("-o", "--output", help="The file to write to. "
+        "Defaults to stdout.")
+
+    convert = add_command("convert", _convert, "Re-pack replays with "
+        "different lzma settings.")
+    add_paths(convert)
+    convert.add_argument("-o", "--output", required=True, help="The "
+        "directory to write the converted replays to. The layout of any "
+        "input directories is preserved.")
+    convert.add_argument("--profile", choices=list(LZMA_PROFILES),
+        default="default", help="The lzma settings to compress with. "
+        "Defaults to default.")
+    convert.add_argument("--dict-size", type=int, help="The lzma dictionary "
+        "size to compress with. Overrides --profile.")
+
+    stat = add_command("stat", _stat, "Summarize a collection of replays.")
+    add_paths(stat)
+
+    bench = add_command("bench", _bench, "Measure how fast replays can be "
+        "parsed on this machine.")
+    add_paths(bench)
+
+    index = add_command("index", _index, "Index the headers of replays into "
+        "a SQLite database. Rescans only parse files which changed since they "
+        "were last indexed.")
+    index.add_argument("database", help="The SQLite database to write the "
+        "index to.")
+    add_paths(index, "The osr files, or directories of osr files, to index.")
+    index.add_argument("--no-prune", action="store_true", help="Keep replays "
+        "in the index whose file no longer exists.")
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    try:
+        args.func(args)
+    except BrokenPipeError:
+        # the output was piped to something like `head`, which stopped
+        # reading. Python would otherwise complain again when flushing stdout
+        # on exit.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+A binary codec for replay data, as an alternative to the lzma compressed text
+of the osr format. Converts losslessly to and from the replay data string
+(ie the decompressed replay data of an osr file).
+
+Every value in the replay data is a decimal number, which is stored as an
+integer mantissa and a count of digits after the decimal point (its scale).
+For instance, ``-125.5`` is stored as ``(-1255, 1)``. The mantissas of each
+column are brought to a common scale, and since cursor positions change slowly
+from one frame to the next, their mantissas are then delta encoded. Each
+column is stored in the narrowest integer type which fits it, and the result
+is optionally compressed with lzma or zstd. The few values which don't fit
+this representation (such as ``1e-05``) are stored as text.
+
+Decoding back to events (``decode_replay_data``) converts each column in bulk,
+and skips both lzma's literal coding of text and text parsing entirely.
+"""
+import lzma
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from osrparse.replay import _Unpacker
+
+CODEC_VERSION = 1
+_MAGIC = b"OSRF"
+# version, compression, flags, number of frames, number of irregular values
+_HEADER = struct.Struct("<BBBqq")
+# index of an irregular value, and its length
+_IRREGULAR = struct.Struct("<qH")
+# typecode and scale of a column
+_COLUMN = struct.Struct("<cB")
+_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+# typecodes to try for a column, narrowest first
+_TYPECODES = ["b", "h", "i", "q"]
+_TYPE_BOUNDS = {code: (-1 << (8 * array(code).itemsize - 1),
+    1 << (8 * array(code).itemsize - 1)) for code in _TYPECODES}
+# which of time_delta, x, y, and keys are delta encoded
+_DELTA = (False, True, True, False)
+# a scale which marks a value as irregular, ie not of the form our decimal
+# representation can reproduce exactly (such as ``1e-05``). These are stored
+# as text instead.
+_IRREGULAR_SCALE = -1
+_POW10 = [10 ** k for k in range(128)]
+
+_TRAILING_COMMA = 1
+
+COMPRESSIONS = ["none", "lzma", "zstd"]
+
+
+def _zstd():
+    # zstd is an optional dependency: in the standard library since python
+    # 3.14, and otherwise provided by the zstandard package.
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires python 3.14 or the "
+            "zstandard package") from None
+    return zstandard
+
+
+def _compress(data, compression):
+    if compression == "lzma":
+        return lzma.compress(data, format=lzma.FORMAT_RAW, filters=_FILTERS)
+    if compression == "zstd":
+        return _zstd().compress(data)
+    return data
+
+
+def _decompress(data, compression):
+    if compression == "lzma":
+        return lzma.decompress(data, format=lzma.FORMAT_RAW,
+            filters=_FILTERS)
+    if compression == "zstd":
+        return _zstd().decompress(data)
+    return bytes(data)
+
+
+def _format_decimal(mantissa, scale):
+    if scale == 0:
+        return str(mantissa)
+    digits = str(abs(mantissa)).rjust(scale + 1, "0")
+    sign = "-" if mantissa < 0 else ""
+    return f"{sign}{digits[:-scale]}.{digits[-scale:]}"
+
+
+def _parse_decimal(value):
+    # returns the (mantissa, scale) of `value`, or None if they don't
+    # reproduce `value` exactly.
+    (whole, dot, fraction) = value.partition(".")
+    try:
+        mantissa = int(whole + fraction)
+    except ValueError:
+        return None
+    scale = len(fraction)
+    if not dot and scale == 0 and str(mantissa) == value:
+        return (mantissa, 0)
+    if dot and scale > 0 and _format_decimal(mantissa, scale) == value:
+        return (mantissa, scale)
+    return None
+
+
+def _narrowest(values):
+    low = min(values, default=0)
+    high = max(values, default=0)
+    for code in _TYPECODES:
+        (lower, upper) = _TYPE_BOUNDS[code]
+        if lower <= low and high < upper:
+            return code
+    return None
+
+
+def _column_scale(scales):
+    # the smallest scale which covers all but at most 0.1% of the values
+    scales = sorted(k for k in scales if k >= 0)
+    if not scales:
+        return 0
+    return scales[len(scales) - 1 - len(scales) // 1000]
+
+
+def _to_le(column):
+    # the codec is little endian, regardless of the platform
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def encode(replay_data_str, *, compression="lzma"):
+    """
+    Encodes a replay data string.
+
+    Parameters
+    ----------
+    replay_data_str: str
+        The replay data to encode, ie the decompressed replay data of an osr
+        file.
+    compression: str
+        How to compress the encoded replay data. One of ``"none"``,
+        ``"lzma"``, or ``"zstd"``. ``"zstd"`` requires python 3.14 or the
+        ``zstandard`` package.
+
+    Returns
+    -------
+    bytes
+        The encoded replay data.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Expected compression to be one of {COMPRESSIONS}, "
+            f"got {compression!r}")
+
+    flags = 0
+    if replay_data_str.endswith(","):
+        flags |= _TRAILING_COMMA
+        replay_data_str = replay_data_str[:-1]
+    frames = replay_data_str.split(",") if replay_data_str else []
+    values = [frame.split("|") for frame in frames]
+    if any(len(frame) != 4 for frame in values):
+        raise ValueError("Expected every frame in the replay data to have "
+            "exactly four values")
+
+    body = []
+    irregular = []
+    scales = array("b")
+    for (i, column) in enumerate(zip(*values) if values else [()] * 4):
+        # most columns only have a few distinct values, so parse each
+        # distinct value once.
+        lookup = {value: _parse_decimal(value) for value in set(column)}
+        decimals = []
+        for (j, value) in enumerate(column):
+            decimal = lookup[value]
+            if decimal is None or decimal[1] >= len(_POW10):
+                decimal = (0, _IRREGULAR_SCALE)
+                irregular.append((j * 4 + i, value))
+            decimals.append(decimal)
+            scales.append(decimal[1])
+
+        # bring every mantissa in the column to the same scale, so that the
+        # deltas between them are meaningful. A handful of values with many
+        # more digits than the rest would blow up every other value in the
+        # column, so those are stored as irregular values instead.
+        scale = _column_scale([k for (_, k) in decimals])
+        mantissas = []
+        previous = 0
+        for (j, (m, k)) in enumerate(decimals):
+            if k > scale:
+                scales[-len(decimals) + j] = _IRREGULAR_SCALE
+                irregular.append((j * 4 + i, column[j]))
+                k = _IRREGULAR_SCALE
+            if k >= 0:
+                previous = m * _POW10[scale - k]
+            # irregular values repeat the previous value, to keep deltas small
+            mantissas.append(previous)
+        if _DELTA[i]:
+            mantissas = [b - a for (a, b) in zip([0] + mantissas, mantissas)]
+        code = _narrowest(mantissas)
+        if code is None:
+            # too large for any column type. Vanishingly unlikely, but we
+            # must stay lossless.
+            start = i * len(values)
+            for (j, value) in enumerate(column):
+                if scales[start + j] != _IRREGULAR_SCALE:
+                    scales[start + j] = _IRREGULAR_SCALE
+                    irregular.append((j * 4 + i, value))
+            (scale, mantissas, code) = (0, [0] * len(column), "b")
+        body.append(_COLUMN.pack(code.encode("ascii"), scale))
+        body.append(_to_le(array(code, mantissas)).tobytes())
+
+    body.append(scales.tobytes())
+    for (index, value) in sorted(irregular):
+        value = value.encode("utf-8")
+        body.append(_IRREGULAR.pack(index, len(value)))
+        body.append(value)
+
+    header = _HEADER.pack(CODEC_VERSION, COMPRESSIONS.index(compression),
+        flags, len(values), len(irregular))
+    return _MAGIC + header + _compress(b"".join(body), compression)
+
+
+def _decode_columns(data):
+    # returns the columns of the encoded replay data as lists of mantissas
+    # (all at the scale of their column), the scale of each column, the
+    # columns of the scales of each value, the irregular values as a dict of
+    # index to string, and the flags.
+    data = memoryview(data).cast("B")
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("Not encoded replay data")
+    (version, compression, flags, length, irregular_count) = (
+        _HEADER.unpack_from(data, len(_MAGIC)))
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported codec version {version}")
+    body = _decompress(data[len(_MAGIC) + _HEADER.size:],
+        COMPRESSIONS[compression])
+
+    offset = 0
+    columns = []
+    column_scales = []
+    for delta in _DELTA:
+        (code, scale) = _COLUMN.unpack_from(body, offset)
+        offset += _COLUMN.size
+        column = array(code.decode("ascii"))
+        end = offset + length * column.itemsize
+        column.frombytes(body[offset:end])
+        offset = end
+        column = _to_le(column)
+        columns.append(list(accumulate(column)) if delta else column.tolist())
+        column_scales.append(scale)
+
+    scales = array("b", body[offset:offset + 4 * length])
+    offset += 4 * length
+    scales = [scales[i * length:(i + 1) * length] for i in range(4)]
+
+    irregular = {}
+    for _ in range(irregular_count):
+        (index, size) = _IRREGULAR.unpack_from(body, offset)
+        offset += _IRREGULAR.size
+        irregular[index] = str(body[offset:offset + size], "utf-8")
+        offset += size
+    if offset != len(body):
+        raise ValueError("Unexpected length of encoded replay data")
+    return (columns, column_scales, scales, irregular, flags)
+
+
+def decode(data):
+    """
+    Decodes encoded replay data back to the exact replay data string it was
+    encoded from.
+
+    Parameters
+    ----------
+    data: bytes-like
+        The encoded replay data, as returned by ``encode``.
+
+    Returns
+    -------
+    str
+        The replay data string.
+    """
+    (columns, column_scales, scales, irregular, flags) = _decode_columns(data)
+    strings = []
+    for (i, column) in enumerate(columns):
+        if column_scales[i] == 0:
+            strings.append(list(map(str, column)))
+        else:
+            p = column_scales[i]
+            strings.append([_format_decimal(m // _POW10[p - k], k) if k >= 0
+                else "" for (m, k) in zip(column, scales[i])])
+        for (index, value) in irregular.items():
+            if index % 4 == i:
+                strings[i][index // 4] = value
+
+    replay_data_str = ",".join(map("|".join, zip(*strings)))
+    if flags & _TRAILING_COMMA:
+        replay_data_str += ","
+    return replay_data_str
+
+
+def decode_replay_data(data, mode):
+    """
+    Decodes encoded replay data directly to events, without going through
+    the replay data string.
+
+    Parameters
+    ----------
+    data: bytes-like
+        The encoded replay data, as returned by ``encode``.
+    mode: GameMode
+        What mode to parse the replay data as.
+
+    Returns
+    -------
+    (List[ReplayEvent], Optional[int])
+        The replay data, and the rng seed of the replay, if any. Identical to
+        parsing the replay data string with ``parse_replay_data``.
+    """
+    (columns, column_scales, _scales, irregular, _flags) = (
+        _decode_columns(data))
+    for (i, column) in enumerate(columns):
+        if column_scales[i] > 0:
+            # true division of integers is correctly rounded, and so gives
+            # the same float as parsing the decimal string would.
+            p = _POW10[column_scales[i]]
+            columns[i] = [m / p for m in column]
+    # irregular values are left as strings, which `build_events` converts
+    # just as it would if they had been parsed from text.
+    for (index, value) in irregular.items():
+        columns[index % 4][index // 4] = value
+
+    rng_seed = _Unpacker.remove_special_frames(columns)
+    return (_Unpacker.build_events(columns, mode), rng_seed)
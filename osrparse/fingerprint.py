@@ -0,0 +1,329 @@
+"""
+Compact fingerprints of replays, for finding duplicate and near-duplicate
+replays (such as stolen or re-uploaded replays) across a large collection.
+
+A fingerprint summarizes the replay data of a replay as a set of shingles:
+
+* the path of the cursor (or catcher), quantized to a coarse grid, with
+  consecutive repeats collapsed, so that the path doesn't depend on the frame
+  rate or timing of the replay. The path of a replay played with HardRock is
+  flipped back, so that a replay stolen by re-playing it with HardRock still
+  matches.
+* the intervals between key presses, quantized to a few milliseconds, so that
+  they don't depend on when the replay starts.
+
+The set of shingles is reduced to a fixed size MinHash signature, whose
+fraction of equal values estimates the Jaccard similarity of two replays'
+shingles. The signature is computed with one permutation hashing: each
+shingle is hashed once, and the hash picks both a slot of the signature and
+the value competing for the minimum in that slot. This costs one hash per
+shingle, instead of one per shingle per slot. ``find_duplicates`` then
+buckets signatures with locality sensitive hashing to find similar pairs
+without comparing every pair of replays.
+"""
+import struct
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import partial
+from hashlib import blake2b
+from math import isfinite
+from typing import Optional, Tuple
+
+from osrparse.utils import GameMode, Mod
+from osrparse.batch import parse_many
+
+# the height of the osu! playfield, for flipping HardRock replays
+_PLAYFIELD_HEIGHT = 384
+# tags for the kinds of shingles, so that different kinds never collide
+_PATH = 1
+_KEYS = 2
+
+
+@dataclass
+class ReplayFingerprint:
+    """
+    A compact fingerprint of a replay, created by ``fingerprint``.
+
+    Attributes
+    ----------
+    mode: GameMode
+        The game mode the replay was played on.
+    beatmap_hash: str
+        The hash of the beatmap the replay was played on.
+    replay_hash: str
+        The hash of the replay.
+    rng_seed: Optional[int]
+        The rng seed of the replay, if any.
+    signature: Tuple[int, ...]
+        The MinHash signature of the replay data. Empty if the replay data
+        has too few frames to fingerprint.
+    """
+    mode: GameMode
+    beatmap_hash: str
+    replay_hash: str
+    rng_seed: Optional[int]
+    signature: Tuple[int, ...]
+
+    def similarity(self, other):
+        """
+        Estimates how similar the replay data of two replays is, as the
+        Jaccard similarity of their shingles.
+
+        Parameters
+        ----------
+        other: ReplayFingerprint
+            The fingerprint to compare against. Must have been created with
+            the same ``num_perm``.
+
+        Returns
+        -------
+        float
+            The estimated similarity, from 0 (nothing in common) to 1
+            (identical).
+        """
+        if not self.signature or not other.signature:
+            return 0.0
+        if len(self.signature) != len(other.signature):
+            raise ValueError("Expected fingerprints with signatures of the "
+                f"same length, got {len(self.signature)} and "
+                f"{len(other.signature)}")
+        equal = sum(a == b for (a, b) in zip(self.signature,
+            other.signature))
+        return equal / len(self.signature)
+
+
+@dataclass
+class Match:
+    """
+    A pair of replays found by ``find_duplicates``.
+
+    Attributes
+    ----------
+    a: Any
+        The key of the first replay.
+    b: Any
+        The key of the second replay.
+    reason: str
+        Why the replays matched. ``"replay_hash"`` or ``"rng_seed"`` if they
+        share that attribute exactly, or ``"similar"`` if their replay data is
+        similar.
+    similarity: float
+        The estimated similarity of their replay data. See
+        ``ReplayFingerprint.similarity``.
+    """
+    a: object
+    b: object
+    reason: str
+    similarity: float
+
+
+def _hash(shingle):
+    # python's hash of a tuple of ints is deterministic, but differs between
+    # platforms. Fingerprints may be stored and compared across machines.
+    data = struct.pack(f"<{len(shingle)}q", *shingle)
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), "little")
+
+
+def _shingles(replay, grid, interval, length):
+    mode = replay.mode
+    flip = mode is GameMode.STD and Mod.HardRock in replay.mods
+    path = []
+    presses = []
+    time_ = 0
+    previous_keys = 0
+    for e in replay.replay_data:
+        time_ += e.time_delta
+        position = None
+        if mode is GameMode.STD:
+            (x, y) = (e.x, e.y)
+            if flip:
+                y = _PLAYFIELD_HEIGHT - y
+            if isfinite(x) and isfinite(y):
+                position = (int(x // grid), int(y // grid))
+            keys = int(e.keys)
+        if mode is GameMode.TAIKO:
+            keys = int(e.keys)
+        if mode is GameMode.CTB:
+            if isfinite(e.x):
+                position = (int(e.x // grid), 0)
+            keys = int(e.dashing)
+        if mode is GameMode.MANIA:
+            keys = int(e.keys)
+
+        if position is not None and (not path or path[-1] != position):
+            path.append(position)
+        pressed = keys & ~previous_keys
+        if pressed:
+            presses.append((time_, pressed))
+        previous_keys = keys
+
+    shingles = set()
+    path = [value for position in path for value in position]
+    for i in range(0, len(path) - 2 * length + 2, 2):
+        shingles.add(_hash((_PATH, *path[i:i + 2 * length])))
+
+    # each press is described by the keys pressed and the time since the
+    # previous press
+    keys = []
+    for ((t1, _), (t2, pressed)) in zip(presses, presses[1:]):
+        keys += [pressed, (t2 - t1) // interval]
+    for i in range(0, len(keys) - 2 * length + 2, 2):
+        shingles.add(_hash((_KEYS, *keys[i:i + 2 * length])))
+    return shingles
+
+
+def _signature(shingles, num_perm):
+    slots = [None] * num_perm
+    for shingle in shingles:
+        (value, slot) = divmod(shingle, num_perm)
+        if slots[slot] is None or value < slots[slot]:
+            slots[slot] = value
+
+    # replays with fewer shingles than slots leave some slots empty. Fill
+    # each from the next slot which isn't, offset by the distance to it so
+    # that filled slots don't all agree with each other. Two replays then
+    # agree on a filled slot exactly when they agree on the slot it was
+    # filled from.
+    values = []
+    for i in range(num_perm):
+        for distance in range(num_perm):
+            value = slots[(i + distance) % num_perm]
+            if value is not None:
+                break
+        values.append(value + (distance << 64))
+    return tuple(values)
+
+
+def fingerprint(replay, *, num_perm=64, grid=16, interval=8, length=4):
+    """
+    Computes a fingerprint of a replay.
+
+    Parameters
+    ----------
+    replay: Replay
+        The replay to fingerprint.
+    num_perm: int
+        The length of the MinHash signature. Longer signatures estimate
+        similarity more accurately, but take longer to compute and compare.
+    grid: float
+        The size of the cells the cursor position is quantized to, in osu!
+        pixels.
+    interval: int
+        The size of the buckets the time between key presses is quantized to,
+        in milliseconds.
+    length: int
+        How many consecutive path cells or key presses make up a shingle.
+
+    Returns
+    -------
+    ReplayFingerprint
+        The fingerprint of the replay. Only fingerprints created with the same
+        parameters can be compared.
+    """
+    shingles = _shingles(replay, grid, interval, length)
+    signature = ()
+    if shingles:
+        signature = _signature(shingles, num_perm)
+    return ReplayFingerprint(replay.mode, replay.beatmap_hash,
+        replay.replay_hash, replay.rng_seed, signature)
+
+
+def fingerprint_many(paths, *, workers=None, executor="process",
+    ordered=True, chunksize=16, **kwargs):
+    """
+    Fingerprints many replays in parallel. Each replay is parsed and
+    fingerprinted in the worker, so only its fingerprint is sent back.
+
+    Parameters
+    ----------
+    paths: str or os.PathLike or Iterable[str or os.PathLike]
+        The paths to the osr files to fingerprint. Directories are searched
+        recursively for ``.osr`` files.
+    workers, executor, ordered, chunksize:
+        See ``parse_many``.
+    **kwargs:
+        Passed to ``fingerprint``.
+
+    Yields
+    ------
+    (path, ReplayFingerprint or Exception)
+        The path of each replay, and either its fingerprint or the exception
+        raised while parsing it.
+    """
+    transform = partial(fingerprint, **kwargs)
+    yield from parse_many(paths, workers=workers, executor=executor,
+        ordered=ordered, chunksize=chunksize, transform=transform)
+
+
+def find_duplicates(fingerprints, *, threshold=0.5, bands=16,
+    same_beatmap=True):
+    """
+    Finds pairs of duplicate or near-duplicate replays.
+
+    Replays which share a ``replay_hash`` or ``rng_seed`` are matched
+    exactly. Every other pair is only compared if their signatures agree on
+    some band of rows (locality sensitive hashing), so the cost grows with
+    the number of replays and matches, not with the number of pairs.
+
+    Parameters
+    ----------
+    fingerprints: Iterable[(Any, ReplayFingerprint)]
+        The key (for instance, the path) and fingerprint of each replay. Pairs
+        whose fingerprint is an exception are skipped, so the output of
+        ``fingerprint_many`` can be passed directly.
+    threshold: float
+        How similar (see ``ReplayFingerprint.similarity``) two replays must be
+        to match.
+    bands: int
+        How many bands to split signatures into. More bands find more
+        candidate pairs at lower similarities, at the cost of comparing more
+        pairs. Must divide the length of the signatures.
+    same_beatmap: bool
+        Whether to only match replays played on the same beatmap.
+
+    Returns
+    -------
+    List[Match]
+        Every matching pair, each reported once.
+    """
+    entries = [(key, fp) for (key, fp) in fingerprints if
+        isinstance(fp, ReplayFingerprint)]
+
+    buckets = defaultdict(list)
+    for (i, (_key, fp)) in enumerate(entries):
+        scope = (fp.mode, fp.beatmap_hash if same_beatmap else None)
+        if fp.replay_hash:
+            buckets[("replay_hash", scope, fp.replay_hash)].append(i)
+        # a seed of 0 isn't a real seed, and would match unrelated replays
+        if fp.rng_seed:
+            buckets[("rng_seed", scope, fp.rng_seed)].append(i)
+        if not fp.signature:
+            continue
+        if len(fp.signature) % bands != 0:
+            raise ValueError(f"Expected bands ({bands}) to divide the length "
+                f"of the signatures ({len(fp.signature)})")
+        rows = len(fp.signature) // bands
+        for band in range(bands):
+            band_rows = fp.signature[band * rows:(band + 1) * rows]
+            buckets[("similar", scope, band, band_rows)].append(i)
+
+    matches = {}
+    # exact matches take precedence over similar ones, so look at their
+    # buckets first
+    buckets = sorted(buckets.items(), key=lambda item: item[0][0] ==
+        "similar")
+    for (bucket, indices) in buckets:
+        reason = bucket[0]
+        for (n, i) in enumerate(indices):
+            for j in indices[n + 1:]:
+                if (i, j) in matches:
+                    continue
+                similarity = entries[i][1].similarity(entries[j][1])
+                if reason == "similar" and similarity < threshold:
+                    # remember failed candidates too, so pairs which share
+                    # several bands are only compared once
+                    matches[(i, j)] = None
+                    continue
+                matches[(i, j)] = Match(entries[i][0], entries[j][0], reason,
+                    similarity)
+    return [match for match in matches.values() if match is not None]
@@ -0,0 +1,400 @@
+"""
+Columnar representations of replay data, backed by numpy structured arrays.
+
+Building one ``ReplayEvent`` per frame is by far the most expensive part of
+parsing a replay. The functions in this module instead parse replay data
+straight into a numpy structured array with one field per column, without
+creating any per-frame python objects.
+
+numpy is an optional dependency of osrparse, and must be installed to use this
+module.
+"""
+import io
+from dataclasses import dataclass
+from enum import IntFlag
+from typing import Dict, Optional
+
+import numpy as np
+
+from osrparse.utils import (GameMode, ReplayEventOsu, ReplayEventTaiko,
+    ReplayEventCatch, ReplayEventMania, Key, KeyTaiko, KeyMania)
+
+# integral columns are parsed through a float64, so values are only exact up
+# to 2 ** 53. This is far beyond anything a real replay contains.
+FRAME_DTYPES = {
+    GameMode.STD: np.dtype([
+        ("time_delta", np.int64),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("keys", np.int32)
+    ]),
+    GameMode.TAIKO: np.dtype([
+        ("time_delta", np.int64),
+        ("x", np.int64),
+        ("keys", np.int32)
+    ]),
+    GameMode.CTB: np.dtype([
+        ("time_delta", np.int64),
+        ("x", np.float64),
+        ("dashing", np.bool_)
+    ]),
+    GameMode.MANIA: np.dtype([
+        ("time_delta", np.int64),
+        ("keys", np.int32)
+    ])
+}
+
+
+def parse_frames(replay_data_str, mode):
+    """
+    Parses decompressed replay data into a structured array.
+
+    Parameters
+    ----------
+    replay_data_str: str
+        The replay data to parse, already decompressed and decoded to ascii.
+    mode: GameMode
+        What mode to parse the replay data as.
+
+    Returns
+    -------
+    (np.ndarray, Optional[int])
+        The parsed frames, with dtype ``FRAME_DTYPES[mode]``, and the rng seed
+        of the replay data, or ``None`` if not present.
+    """
+    dtype = FRAME_DTYPES[mode]
+    # see `_Unpacker.parse_replay_data` for the reasoning behind the special
+    # cases in this function.
+    replay_data_str = replay_data_str.rstrip(",")
+    if not replay_data_str:
+        return (np.empty(0, dtype=dtype), None)
+
+    # one frame per line lets numpy's C parser do all of the work
+    values = io.StringIO(replay_data_str.replace(",", "\n"))
+    values = np.loadtxt(values, dtype=np.float64, delimiter="|", ndmin=2)
+    if values.shape[1] != 4:
+        raise ValueError("Expected every frame in the replay data to have "
+            "exactly four values")
+
+    rng_seed = None
+    if values[-1, 0] == -12345:
+        rng_seed = int(values[-1, 3])
+        values = values[:-1]
+
+    skip = values[:2]
+    skip = (skip[:, 1] == 256) & (skip[:, 2] == -500)
+    if skip.any():
+        keep = np.ones(len(values), dtype=np.bool_)
+        keep[:2] = ~skip
+        values = values[keep]
+
+    frames = np.empty(len(values), dtype=dtype)
+    frames["time_delta"] = values[:, 0]
+    if mode is GameMode.STD:
+        frames["x"] = values[:, 1]
+        frames["y"] = values[:, 2]
+        frames["keys"] = values[:, 3]
+    if mode is GameMode.TAIKO:
+        frames["x"] = values[:, 1]
+        frames["keys"] = values[:, 3]
+    if mode is GameMode.CTB:
+        frames["x"] = values[:, 1]
+        frames["dashing"] = values[:, 3] == 1
+    if mode is GameMode.MANIA:
+        frames["keys"] = values[:, 1]
+
+    return (frames, rng_seed)
+
+
+def frames_from_events(replay_data, mode):
+    """
+    Converts a list of replay events to a structured array.
+
+    Parameters
+    ----------
+    replay_data: List[ReplayEvent]
+        The replay events to convert.
+    mode: GameMode
+        The mode of the replay events.
+
+    Returns
+    -------
+    np.ndarray
+        The converted frames, with dtype ``FRAME_DTYPES[mode]``.
+    """
+    if mode is GameMode.STD:
+        rows = [(e.time_delta, e.x, e.y, e.keys) for e in replay_data]
+    if mode is GameMode.TAIKO:
+        rows = [(e.time_delta, e.x, e.keys) for e in replay_data]
+    if mode is GameMode.CTB:
+        rows = [(e.time_delta, e.x, e.dashing) for e in replay_data]
+    if mode is GameMode.MANIA:
+        rows = [(e.time_delta, e.keys) for e in replay_data]
+    return np.array(rows, dtype=FRAME_DTYPES[mode])
+
+
+def events_from_frames(frames, mode):
+    """
+    Converts a structured array to a list of replay events.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The frames to convert, with dtype ``FRAME_DTYPES[mode]``.
+    mode: GameMode
+        The mode of the frames.
+
+    Returns
+    -------
+    List[ReplayEvent]
+        The converted replay events.
+    """
+    # a replay only has a handful of distinct key states, so only create each
+    # flag once.
+    def flags(column, flag):
+        column = column.tolist()
+        lookup = {value: flag(value) for value in set(column)}
+        return map(lookup.__getitem__, column)
+
+    time_delta = frames["time_delta"].tolist()
+    if mode is GameMode.STD:
+        return list(map(ReplayEventOsu, time_delta, frames["x"].tolist(),
+            frames["y"].tolist(), flags(frames["keys"], Key)))
+    if mode is GameMode.TAIKO:
+        return list(map(ReplayEventTaiko, time_delta, frames["x"].tolist(),
+            flags(frames["keys"], KeyTaiko)))
+    if mode is GameMode.CTB:
+        return list(map(ReplayEventCatch, time_delta, frames["x"].tolist(),
+            frames["dashing"].tolist()))
+    if mode is GameMode.MANIA:
+        return list(map(ReplayEventMania, time_delta,
+            flags(frames["keys"], KeyMania)))
+
+
+def format_frames(frames, mode):
+    """
+    Formats a structured array as uncompressed replay data, in the same format
+    as ``_Packer.pack_replay_data``.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The frames to format, with dtype ``FRAME_DTYPES[mode]``.
+    mode: GameMode
+        The mode of the frames.
+
+    Returns
+    -------
+    str
+        The formatted replay data, including a trailing comma if there are any
+        frames.
+    """
+    # `tolist` gives us python ints and floats, whose formatting matches
+    # `_Packer.pack_replay_data` exactly.
+    time_delta = frames["time_delta"].tolist()
+    if mode is GameMode.STD:
+        rows = zip(time_delta, frames["x"].tolist(), frames["y"].tolist(),
+            frames["keys"].tolist())
+        data = [f"{t}|{x}|{y}|{k}," for (t, x, y, k) in rows]
+    if mode is GameMode.TAIKO:
+        rows = zip(time_delta, frames["x"].tolist(), frames["keys"].tolist())
+        data = [f"{t}|{x}|0|{k}," for (t, x, k) in rows]
+    if mode is GameMode.CTB:
+        rows = zip(time_delta, frames["x"].tolist(),
+            frames["dashing"].astype(np.int8).tolist())
+        data = [f"{t}|{x}|0|{d}," for (t, x, d) in rows]
+    if mode is GameMode.MANIA:
+        rows = zip(time_delta, frames["keys"].tolist())
+        data = [f"{t}|{k}|0|0," for (t, k) in rows]
+    return "".join(data)
+
+
+def _mode_of(frames):
+    for mode, dtype in FRAME_DTYPES.items():
+        if frames.dtype == dtype:
+            return mode
+    raise ValueError(f"Unknown frame dtype {frames.dtype}")
+
+
+def absolute_time(frames):
+    """
+    The absolute time of each frame, ie the cumulative sum of ``time_delta``.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The frames to compute the absolute time of.
+
+    Returns
+    -------
+    np.ndarray
+        The absolute time, in ms, of each frame.
+    """
+    return np.cumsum(frames["time_delta"])
+
+
+def _derivative(values, time_delta):
+    # the derivative of the first frame, and of frames which don't advance
+    # time, is undefined.
+    result = np.full(values.shape, np.nan)
+    dt = time_delta[1:, None].astype(np.float64)
+    np.divide(np.diff(values, axis=0), dt, out=result[1:], where=dt > 0)
+    return result
+
+
+def cursor_position(frames):
+    """
+    The cursor position of each frame, as an ``(n, 2)`` array of ``x`` and
+    ``y`` for osu!standard frames, or an ``(n, 1)`` array of ``x`` for
+    osu!catch frames.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The osu!standard or osu!catch frames to compute the cursor position of.
+
+    Returns
+    -------
+    np.ndarray
+        The cursor position of each frame.
+    """
+    mode = _mode_of(frames)
+    if mode is GameMode.STD:
+        return np.stack([frames["x"], frames["y"]], axis=1)
+    if mode is GameMode.CTB:
+        return frames["x"][:, None].astype(np.float64)
+    raise ValueError(f"Frames of mode {mode} do not have a cursor position")
+
+
+def cursor_velocity(frames):
+    """
+    The velocity of the cursor at each frame, in osu!pixels per ms. See
+    ``cursor_position`` for the shape of the returned array.
+
+    The velocity of the first frame, and of frames with a ``time_delta`` of
+    zero or less, is ``nan``.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The osu!standard or osu!catch frames to compute the velocity of.
+
+    Returns
+    -------
+    np.ndarray
+        The velocity of the cursor at each frame.
+    """
+    return _derivative(cursor_position(frames), frames["time_delta"])
+
+
+def cursor_acceleration(frames):
+    """
+    The acceleration of the cursor at each frame, in osu!pixels per ms². See
+    ``cursor_position`` for the shape of the returned array.
+
+    The acceleration of the first two frames, and of frames where either the
+    frame or the previous frame has a ``time_delta`` of zero or less, is
+    ``nan``.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The osu!standard or osu!catch frames to compute the acceleration of.
+
+    Returns
+    -------
+    np.ndarray
+        The acceleration of the cursor at each frame.
+    """
+    return _derivative(cursor_velocity(frames), frames["time_delta"])
+
+
+def key_intervals(frames):
+    """
+    The intervals during which each key was held down.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The osu!standard, osu!taiko, or osu!mania frames to compute the key
+        intervals of.
+
+    Returns
+    -------
+    Dict[Key or KeyTaiko or KeyMania, np.ndarray]
+        An ``(n, 2)`` array of the absolute press and release time of each
+        press of each key. A key still held at the last frame is released at
+        the time of the last frame.
+    """
+    key_type = {
+        GameMode.STD: Key,
+        GameMode.TAIKO: KeyTaiko,
+        GameMode.MANIA: KeyMania
+    }.get(_mode_of(frames))
+    if key_type is None:
+        raise ValueError("osu!catch frames do not have keys")
+
+    time = absolute_time(frames)
+    # a release at index `len(frames)` means the key was never released.
+    time = np.append(time, time[-1:])
+    keys = frames["keys"]
+
+    intervals = {}
+    for key in key_type:
+        pressed = (keys & key.value) != 0
+        edges = np.diff(pressed.astype(np.int8), prepend=0, append=0)
+        press = time[np.flatnonzero(edges == 1)]
+        release = time[np.flatnonzero(edges == -1)]
+        intervals[key] = np.stack([press, release], axis=1)
+    return intervals
+
+
+@dataclass
+class Kinematics:
+    """
+    The derived kinematics of a replay's frames. See ``kinematics``.
+
+    Attributes
+    ----------
+    time: np.ndarray
+        The absolute time of each frame. See ``absolute_time``.
+    velocity: Optional[np.ndarray]
+        The velocity of the cursor at each frame, or ``None`` for osu!taiko
+        and osu!mania frames. See ``cursor_velocity``.
+    acceleration: Optional[np.ndarray]
+        The acceleration of the cursor at each frame, or ``None`` for
+        osu!taiko and osu!mania frames. See ``cursor_acceleration``.
+    key_intervals: Optional[Dict[IntFlag, np.ndarray]]
+        The intervals during which each key was held down, or ``None`` for
+        osu!catch frames. See ``key_intervals``.
+    """
+    time: np.ndarray
+    velocity: Optional[np.ndarray]
+    acceleration: Optional[np.ndarray]
+    key_intervals: Optional[Dict[IntFlag, np.ndarray]]
+
+
+def kinematics(frames):
+    """
+    Computes every kinematic quantity which applies to the mode of ``frames``.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        The frames to compute the kinematics of.
+
+    Returns
+    -------
+    Kinematics
+        The kinematics of the frames.
+    """
+    mode = _mode_of(frames)
+    velocity = None
+    acceleration = None
+    intervals = None
+    if mode in [GameMode.STD, GameMode.CTB]:
+        velocity = cursor_velocity(frames)
+        acceleration = _derivative(velocity, frames["time_delta"])
+    if mode is not GameMode.CTB:
+        intervals = key_intervals(frames)
+    return Kinematics(absolute_time(frames), velocity, acceleration, intervals)
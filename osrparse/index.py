@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import mmap as mmap_
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Tuple
+
+from osrparse.utils import GameMode, Mod
+from osrparse.replay import ReplayHeader, _Unpacker
+from osrparse.batch import _expand_paths, _run_chunks
+
+# bump whenever the schema changes. An index with a different schema version
+# is rebuilt from scratch.
+SCHEMA_VERSION = 1
+# the columns of a ReplayHeader, in order
+_HEADER_COLUMNS = ["mode", "game_version", "beatmap_hash", "username",
+    "replay_hash", "count_300", "count_100", "count_50", "count_geki",
+    "count_katu", "count_miss", "score", "max_combo", "perfect", "mods",
+    "timestamp", "replay_id"]
+_SCHEMA = f"""
+CREATE TABLE replays (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    game_version INTEGER NOT NULL,
+    beatmap_hash TEXT,
+    username TEXT,
+    replay_hash TEXT,
+    count_300 INTEGER NOT NULL,
+    count_100 INTEGER NOT NULL,
+    count_50 INTEGER NOT NULL,
+    count_geki INTEGER NOT NULL,
+    count_katu INTEGER NOT NULL,
+    count_miss INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    max_combo INTEGER NOT NULL,
+    perfect INTEGER NOT NULL,
+    mods INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    replay_id INTEGER NOT NULL,
+    frames_offset INTEGER NOT NULL,
+    frames_length INTEGER NOT NULL
+);
+CREATE INDEX replays_beatmap_user ON replays (beatmap_hash, username);
+CREATE INDEX replays_user ON replays (username);
+CREATE INDEX replays_replay_hash ON replays (replay_hash);
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+
+@dataclass
+class IndexUpdate:
+    """
+    What changed in a ``ReplayIndex`` during a call to ``ReplayIndex.update``.
+
+    Attributes
+    ----------
+    added: int
+        How many replays were added to the index.
+    updated: int
+        How many replays were re-indexed because their file changed.
+    removed: int
+        How many replays were removed from the index because their file no
+        longer exists.
+    unchanged: int
+        How many replays were skipped because their file hasn't changed since
+        it was indexed.
+    errors: List[Tuple[str, Exception]]
+        The path of each file which could not be indexed, and the exception
+        raised while indexing it.
+    """
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    errors: List[Tuple[str, Exception]] = field(default_factory=list)
+
+
+def _index_chunk(items):
+    results = []
+    for (path, size, mtime_ns) in items:
+        try:
+            with open(path, "rb") as f:
+                with mmap_.mmap(f.fileno(), 0, access=mmap_.ACCESS_READ) as m:
+                    unpacker = _Unpacker(m)
+                    try:
+                        header = unpacker.unpack(frames=False)
+                        # header-only parsing skips straight over the replay
+                        # data, so find it again to record where it is.
+                        unpacker.offset = 0
+                        (_mode, frames_length) = unpacker.locate_play_data()
+                        frames_offset = unpacker.offset
+                    finally:
+                        unpacker.release()
+            row = [path, size, mtime_ns, header.mode.value,
+                header.game_version, header.beatmap_hash, header.username,
+                header.replay_hash, header.count_300, header.count_100,
+                header.count_50, header.count_geki, header.count_katu,
+                header.count_miss, header.score, header.max_combo,
+                header.perfect, header.mods.value,
+                header.timestamp.isoformat(), header.replay_id,
+                frames_offset, frames_length]
+        except Exception as e:
+            row = e
+        results.append((path, row))
+    return results
+
+
+class ReplayIndex:
+    """
+    A SQLite index of the headers of many replays, for answering queries like
+    "every replay on this beatmap by this user with these mods" without
+    parsing any replays.
+
+    Parameters
+    ----------
+    path: str or os.PathLike
+        The path to the SQLite database to store the index in. Created if it
+        doesn't exist.
+
+    Notes
+    -----
+    The index is a single ``replays`` table, with a column for the path, size,
+    and modification time of each file, each attribute of its
+    ``ReplayHeader``, and the offset and length of its compressed replay data
+    within the file. The database can be queried directly with SQL as well.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            with self.connection:
+                self.connection.execute("DROP TABLE IF EXISTS replays")
+            self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM replays").fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        self.connection.close()
+
+    def update(self, paths, *, workers=None, executor="process",
+        chunksize=64, prune=True):
+        """
+        Indexes the replays at the given paths. Files which were already
+        indexed are only parsed again if their size or modification time has
+        changed.
+
+        Parameters
+        ----------
+        paths: str or os.PathLike or Iterable[str or os.PathLike]
+            The paths to the osr files to index. Directories are searched
+            recursively for ``.osr`` files.
+        workers: int
+            How many workers to parse with. See ``parse_many``.
+        executor: str
+            Whether to parse in a pool of processes (``"process"``) or threads
+            (``"thread"``).
+        chunksize: int
+            How many replays each worker parses per task.
+        prune: bool
+            Whether to remove replays from the index whose file was under one
+            of the given directories (or was one of the given files), but no
+            longer exists.
+
+        Returns
+        -------
+        IndexUpdate
+            What changed in the index.
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        paths = [os.path.abspath(path) for path in paths]
+        known = self._known(paths)
+        stale = set()
+        result = IndexUpdate()
+
+        def changed():
+            for path in _expand_paths(paths):
+                path = str(path)
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    result.errors.append((path, e))
+                    continue
+                previous = known.pop(path, None)
+                if previous == (stat.st_size, stat.st_mtime_ns):
+                    result.unchanged += 1
+                    continue
+                if previous is not None:
+                    stale.add(path)
+                yield (path, stat.st_size, stat.st_mtime_ns)
+
+        rows = _run_chunks(_index_chunk, changed(), workers=workers,
+            executor=executor, chunksize=chunksize, ordered=False)
+        placeholders = ", ".join(["?"] * 22)
+        with self.connection:
+            for (path, row) in rows:
+                if isinstance(row, Exception):
+                    result.errors.append((path, row))
+                    # don't keep a stale entry for a file we can't parse
+                    self.connection.execute(
+                        "DELETE FROM replays WHERE path = ?", [path])
+                    continue
+                self.connection.execute("INSERT OR REPLACE INTO replays "
+                    f"VALUES ({placeholders})", row)
+                if path in stale:
+                    result.updated += 1
+                else:
+                    result.added += 1
+
+            # anything left in `known` was not found this time around
+            if prune:
+                self.connection.executemany(
+                    "DELETE FROM replays WHERE path = ?",
+                    [[path] for path in known])
+                result.removed = len(known)
+        return result
+
+    def _known(self, paths):
+        # the size and modification time of every indexed file under `paths`
+        known = {}
+        for path in paths:
+            if os.path.isdir(path):
+                prefix = os.path.join(path, "")
+                # compare the prefix exactly. LIKE would be simpler, but
+                # ignores case.
+                rows = self.connection.execute("SELECT path, size, mtime_ns "
+                    "FROM replays WHERE substr(path, 1, length(?)) = ?",
+                    [prefix, prefix])
+            else:
+                rows = self.connection.execute("SELECT path, size, mtime_ns "
+                    "FROM replays WHERE path = ?", [path])
+            for (path_, size, mtime_ns) in rows:
+                known[path_] = (size, mtime_ns)
+        return known
+
+    def query(self, *, mode=None, beatmap_hash=None, username=None,
+        replay_hash=None, mods=None, include_mods=None):
+        """
+        Returns the indexed replays matching every given criterion.
+
+        Parameters
+        ----------
+        mode: GameMode
+            Only return replays played on this mode.
+        beatmap_hash: str
+            Only return replays played on the beatmap with this hash.
+        username: str
+            Only return replays played by this user.
+        replay_hash: str
+            Only return replays with this hash.
+        mods: Mod
+            Only return replays played with exactly these mods.
+        include_mods: Mod
+            Only return replays played with at least these mods.
+
+        Returns
+        -------
+        List[(str, ReplayHeader)]
+            The path and header of each matching replay, ordered by path.
+        """
+        conditions = []
+        parameters = []
+        if mode is not None:
+            mode = mode.value
+        if mods is not None:
+            mods = int(mods)
+        for (column, value) in [("mode", mode),
+            ("beatmap_hash", beatmap_hash), ("username", username),
+            ("replay_hash", replay_hash), ("mods", mods)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if include_mods is not None:
+            conditions.append("mods & ? = ?")
+            parameters += [int(include_mods), int(include_mods)]
+
+        where = " AND ".join(conditions) or "1"
+        columns = ", ".join(_HEADER_COLUMNS)
+        rows = self.connection.execute(f"SELECT path, {columns} FROM replays "
+            f"WHERE {where} ORDER BY path", parameters)
+        return [(path, self._header(row)) for (path, *row) in rows]
+
+    @staticmethod
+    def _header(row):
+        row[0] = GameMode(row[0])
+        row[14] = Mod(row[14])
+        row[15] = datetime.fromisoformat(row[15])
+        return ReplayHeader(*row)
@@ -0,0 +1,300 @@
+"""
+Opt-in timing of the individual stages of parsing and writing replays.
+
+Profiling works by replacing the methods of the parser which implement each
+stage with timed wrappers while a ``profile`` block is active, and restoring
+them afterwards. When no ``profile`` block is active, parsing runs exactly the
+same code as if this module didn't exist.
+
+The stages are:
+
+* ``header``: parsing the header fields before the life bar.
+* ``life_bar``: parsing the life bar.
+* ``replay_id``: parsing the replay id.
+* ``decompress``: lzma decompressing the replay data.
+* ``tokenize``: splitting the replay data into columns of strings.
+* ``build_events``: building events from those columns.
+* ``pack_header``: writing everything before the replay data.
+* ``format``: formatting events as replay data text.
+* ``compress``: lzma compressing replay data text.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from time import perf_counter
+from typing import Dict
+
+from osrparse.replay import _Unpacker, _Packer
+
+
+@dataclass
+class StageStats:
+    """
+    The cost of a stage of parsing or writing replays, summed over every time
+    it ran.
+
+    Attributes
+    ----------
+    calls: int
+        How many times the stage ran.
+    seconds: float
+        How long the stage took in total.
+    bytes_in: int
+        How many bytes (or characters, for text) the stage read.
+    bytes_out: int
+        How many bytes (or characters, for text) the stage produced.
+    frames: int
+        How many frames the stage processed, for stages which work on frames.
+    """
+    calls: int = 0
+    seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    frames: int = 0
+
+    def add(self, other):
+        """
+        Adds the cost of ``other`` to this stage.
+
+        Parameters
+        ----------
+        other: StageStats
+            The stats to add.
+        """
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.frames += other.frames
+
+
+@dataclass
+class ProfileStats:
+    """
+    The cost of each stage of parsing or writing replays, recorded by
+    ``profile``.
+
+    Attributes
+    ----------
+    stages: Dict[str, StageStats]
+        The stats of each stage which ran at least once, by stage name.
+    """
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # so stats can be sent back from worker processes and merged
+        return {"stages": self.stages}
+
+    def __setstate__(self, state):
+        self.stages = state["stages"]
+        self.__post_init__()
+
+    def record(self, stage, stats):
+        """
+        Adds ``stats`` to the stats of ``stage``.
+
+        Parameters
+        ----------
+        stage: str
+            The name of the stage.
+        stats: StageStats
+            The stats to add.
+        """
+        with self._lock:
+            self.stages.setdefault(stage, StageStats()).add(stats)
+
+    def merge(self, other):
+        """
+        Adds every stage of ``other`` to these stats. Useful for combining
+        stats recorded in several worker processes.
+
+        Parameters
+        ----------
+        other: ProfileStats
+            The stats to add.
+        """
+        for (stage, stats) in list(other.stages.items()):
+            self.record(stage, stats)
+
+    def reset(self):
+        """
+        Discards every recorded stage.
+        """
+        with self._lock:
+            self.stages.clear()
+
+    @property
+    def seconds(self):
+        """
+        How long every stage took in total.
+        """
+        return sum(stats.seconds for stats in self.stages.values())
+
+    def as_dict(self):
+        """
+        Returns the stats as plain dicts, for exporting to json or a metrics
+        system.
+
+        Returns
+        -------
+        Dict[str, Dict[str, int or float]]
+            The fields of the ``StageStats`` of each stage, by stage name.
+        """
+        with self._lock:
+            return {stage: asdict(stats) for (stage, stats) in
+                self.stages.items()}
+
+
+# the (stats, callback) of each active `profile` block
+_active = []
+# guards `_active` and patching the parser
+_lock = threading.Lock()
+# the original methods of the parser, while patched
+_originals = {}
+
+
+def _record(stage, stats):
+    for (profile_stats, callback) in list(_active):
+        profile_stats.record(stage, stats)
+        if callback is not None:
+            callback(stage, stats)
+
+
+def _offset_stage(stage, method):
+    # times a method of `_Unpacker`, counting the bytes it read from the osr
+    # data.
+    def timed(self, *args, **kwargs):
+        offset = self.offset
+        start = perf_counter()
+        result = method(self, *args, **kwargs)
+        seconds = perf_counter() - start
+        _record(stage, StageStats(1, seconds, bytes_in=self.offset - offset))
+        return result
+    return timed
+
+
+def _stage(stage, method, measure):
+    # times `method`. `measure(args, result)` returns the bytes_in,
+    # bytes_out, and frames of each call.
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        result = method(*args, **kwargs)
+        seconds = perf_counter() - start
+        (bytes_in, bytes_out, frames) = measure(args, result)
+        _record(stage, StageStats(1, seconds, bytes_in, bytes_out, frames))
+        return result
+    return timed
+
+
+def _measure_decompress(args, result):
+    (data,) = args
+    return (len(data), len(result), 0)
+
+
+def _measure_tokenize(args, result):
+    (replay_data_str,) = args
+    (columns, _rng_seed) = result
+    return (len(replay_data_str), 0, len(columns[0]))
+
+
+def _measure_build_events(_args, result):
+    return (0, 0, len(result))
+
+
+def _measure_pack_header(_args, result):
+    return (0, len(result), 0)
+
+
+def _measure_format(args, result):
+    (_packer, events) = args
+    return (0, len(result), len(events))
+
+
+def _measure_compress(args, result):
+    (_packer, _compressor, data) = args
+    return (0 if data is None else len(data), len(result), 0)
+
+
+# (class, method name, stage, measure) for each profiled method. Methods
+# without a measure are `_Unpacker` methods which read from the osr data.
+_STAGES = [
+    (_Unpacker, "unpack_fields", "header", None),
+    (_Unpacker, "unpack_life_bar", "life_bar", None),
+    (_Unpacker, "unpack_replay_id", "replay_id", None),
+    (_Unpacker, "decompress", "decompress", _measure_decompress),
+    (_Unpacker, "tokenize_replay_data", "tokenize", _measure_tokenize),
+    (_Unpacker, "build_events", "build_events", _measure_build_events),
+    (_Packer, "pack_header", "pack_header", _measure_pack_header),
+    (_Packer, "format_events", "format", _measure_format),
+    (_Packer, "compress", "compress", _measure_compress)
+]
+
+
+def _patch():
+    for (cls, name, stage, measure) in _STAGES:
+        original = cls.__dict__[name]
+        _originals[(cls, name)] = original
+        if measure is None:
+            setattr(cls, name, _offset_stage(stage, original))
+        elif isinstance(original, staticmethod):
+            setattr(cls, name, staticmethod(_stage(stage, original.__func__,
+                measure)))
+        else:
+            setattr(cls, name, _stage(stage, original, measure))
+
+
+def _unpatch():
+    for ((cls, name), original) in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+
+
+@contextmanager
+def profile(stats=None, *, callback=None):
+    """
+    Records how long each stage of parsing and writing replays takes, and how
+    many bytes and frames it processes, for the duration of the ``with``
+    block.
+
+    Parameters
+    ----------
+    stats: ProfileStats
+        The stats to add to. Defaults to new, empty stats.
+    callback: Callable[[str, StageStats], None]
+        Called with the name of the stage and its stats every time a stage
+        runs, for instance to forward them to a metrics system.
+
+    Yields
+    ------
+    ProfileStats
+        The stats, which are updated as stages run.
+
+    Notes
+    -----
+    Every replay parsed or written in this process while the block is active
+    is recorded, from any thread. Replays parsed in worker processes (such as
+    by ``parse_many``) are not; profile inside the workers instead, and
+    combine their stats with ``ProfileStats.merge``.
+
+    Only bulk parsing is profiled. Streaming parsing (``Replay.iter_frames``
+    and ``iter_replay_data``) is not broken into these stages.
+    """
+    if stats is None:
+        stats = ProfileStats()
+    entry = (stats, callback)
+    with _lock:
+        if not _active:
+            _patch()
+        _active.append(entry)
+    try:
+        yield stats
+    finally:
+        with _lock:
+            # by identity, since equal stats compare equal
+            del _active[next(i for (i, e) in enumerate(_active)
+                if e is entry)]
+            if not _active:
+                _unpatch()
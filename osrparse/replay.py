@@ -1,44 +1,78 @@
 import lzma
 import struct
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional
+from typing import List, Optional, Iterator
 import base64
+import io
+import mmap as mmap_
+import shutil
+import tempfile
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
+from itertools import accumulate
 
 from osrparse.utils import (Mod, GameMode, ReplayEvent, ReplayEventOsu,
     ReplayEventCatch, ReplayEventMania, ReplayEventTaiko, Key, KeyMania,
     KeyTaiko, LifeBarState)
 
 
+# precompiled structs for the fixed width parts of the osr format. Compiling a
+# format string once is significantly cheaper than parsing it on every call.
+_BYTE = struct.Struct("<B")
+_SHORT = struct.Struct("<H")
+_INT = struct.Struct("<I")
+_LONG = struct.Struct("<q")
+# mode, game_version
+_PREAMBLE = struct.Struct("<BI")
+# count_300, count_100, count_50, count_geki, count_katu, count_miss, score,
+# max_combo, perfect, mods
+_STATS = struct.Struct("<6HIHBI")
+# marks a lazily computed attribute as not computed yet, where None is a valid
+# value
+_UNKNOWN = object()
+
+
 class _Unpacker:
     """
     Helper class for dealing with the ``.osr`` format. Not intended to be used
     by consumers.
     """
     def __init__(self, replay_data):
-        self.replay_data = replay_data
+        # a view lets us slice any buffer (bytes, bytearray, mmap, ...) without
+        # copying it.
+        self.replay_data = memoryview(replay_data).cast("B")
         self.offset = 0
 
+    def release(self):
+        # an mmap can't be closed while we hold a view on it
+        self.replay_data.release()
+
     def unpack_byte(self):
-        return self.unpack_once("<B")
+        return self.unpack_struct(_BYTE)[0]
 
     def unpack_short(self):
-        return self.unpack_once("<H")
+        return self.unpack_struct(_SHORT)[0]
 
     def unpack_int(self):
-        return self.unpack_once("<I")
+        return self.unpack_struct(_INT)[0]
 
     def unpack_long(self):
-        return self.unpack_once("<q")
+        return self.unpack_struct(_LONG)[0]
 
-    def unpack_once(self, specifier):
-        unpacked = struct.unpack_from(specifier, self.replay_data, self.offset)
-        self.offset += struct.calcsize(specifier)
-        # `struct.unpack_from` always returns a tuple, even if there's only one
-        # element
-        return unpacked[0]
+    def unpack_struct(self, struct_):
+        unpacked = struct_.unpack_from(self.replay_data, self.offset)
+        self.offset += struct_.size
+        return unpacked
 
     def string_length(self, binarystream):
+        # almost every string in a replay is shorter than 128 bytes, and so
+        # has a single byte length.
+        byte = binarystream[self.offset]
+        if byte < 0b10000000:
+            self.offset += 1
+            return byte
+
         result = 0
         shift = 0
         while True:
@@ -50,6 +84,17 @@ class _Unpacker:
             shift += 7
         return result
 
+    def skip_string(self):
+        if self.replay_data[self.offset] == 0x00:
+            self.offset += 1
+        elif self.replay_data[self.offset] == 0x0b:
+            self.offset += 1
+            string_length = self.string_length(self.replay_data)
+            self.offset += string_length
+        else:
+            raise ValueError("Expected the first byte of a string to be 0x00 "
+                f"or 0x0b, but got {self.replay_data[self.offset]}")
+
     def unpack_string(self):
         if self.replay_data[self.offset] == 0x00:
             self.offset += 1
@@ -57,7 +102,7 @@ class _Unpacker:
             self.offset += 1
             string_length = self.string_length(self.replay_data)
             offset_end = self.offset + string_length
-            string = self.replay_data[self.offset:offset_end].decode("utf-8")
+            string = str(self.replay_data[self.offset:offset_end], "utf-8")
             self.offset = offset_end
             return string
         else:
@@ -66,61 +111,230 @@ class _Unpacker:
 
     def unpack_timestamp(self):
         ticks = self.unpack_long()
-        timestamp = datetime.min + timedelta(microseconds=ticks/10)
+        # a tick is 100 nanoseconds. Stay in integers, since a float can't
+        # represent the number of microseconds since year 0001 exactly, but
+        # round half to even as `timedelta` does.
+        (microseconds, remainder) = divmod(ticks, 10)
+        if remainder > 5 or (remainder == 5 and microseconds % 2 == 1):
+            microseconds += 1
+        timestamp = datetime.min + timedelta(microseconds=microseconds)
         timestamp = timestamp.replace(tzinfo=timezone.utc)
         return timestamp
 
-    def unpack_play_data(self, mode):
+    def unpack_play_data(self):
+        # we only copy out the compressed replay data here. Decompressing and
+        # parsing it is deferred until the replay data is first accessed (see
+        # `Replay._decompress_frames`). We need our own copy since the replay
+        # may outlive the buffer we're reading from.
         replay_length = self.unpack_int()
         offset_end = self.offset + replay_length
-        data = self.replay_data[self.offset:offset_end]
-        data = lzma.decompress(data, format=lzma.FORMAT_AUTO)
-        data = data.decode("ascii")
-        (replay_data, rng_seed) = self.parse_replay_data(data, mode)
+        data = bytes(self.replay_data[self.offset:offset_end])
         self.offset = offset_end
-        return (replay_data, rng_seed)
+        return data
+
+    @staticmethod
+    def decompress(data):
+        data = lzma.decompress(data, format=lzma.FORMAT_AUTO)
+        return data.decode("ascii")
+
+    @staticmethod
+    def decompress_play_data(data, mode):
+        data = _Unpacker.decompress(data)
+        return _Unpacker.parse_replay_data(data, mode)
+
+    def skip_play_data(self):
+        # the compressed replay data is prefixed with its length, so we can
+        # jump straight over it without decompressing anything.
+        replay_length = self.unpack_int()
+        self.offset += replay_length
 
     @staticmethod
     def parse_replay_data(replay_data_str, mode):
+        columns, rng_seed = _Unpacker.tokenize_replay_data(replay_data_str)
+        play_data = _Unpacker.build_events(columns, mode)
+        return (play_data, rng_seed)
+
+    @staticmethod
+    def tokenize_replay_data(replay_data_str):
+        # splits the replay data into columns of strings, one per field of a
+        # frame, so that each column can be converted in bulk.
+
         # remove trailing comma (if it exists) to make splitting easier.
         # stable always adds a trailing comma, but some lazer versions do not.
         replay_data_str = replay_data_str.rstrip(",")
-        events = [event.split('|') for event in replay_data_str.split(',')]
+        if not replay_data_str:
+            return (([], [], [], []), None)
+
+        values = replay_data_str.replace("|", ",").split(",")
+        if len(values) % 4 != 0:
+            raise ValueError("Expected every frame in the replay data to have "
+                "exactly four values")
+        time_delta = values[0::4]
+        x = values[1::4]
+        y = values[2::4]
+        keys = values[3::4]
+
+        columns = (time_delta, x, y, keys)
+        rng_seed = _Unpacker.remove_special_frames(columns)
+        return (columns, rng_seed)
+
+    @staticmethod
+    def find_rng_seed(replay_data_str):
+        # returns the rng seed of the replay data, if any, without parsing any
+        # other frame. The rng seed frame is always the last frame.
+        last = replay_data_str.rstrip(",").rpartition(",")[2]
+        (time_delta, _, rest) = last.partition("|")
+        if not time_delta or int(time_delta) != -12345:
+            return None
+        return int(rest.split("|")[2])
 
+    @staticmethod
+    def remove_special_frames(columns):
+        # removes the frames which aren't part of the replay data proper from
+        # `columns` (lists of either strings or numbers), and returns the rng
+        # seed, if any.
+        (time_delta, x, y, keys) = columns
         rng_seed = None
-        play_data = []
-        for i, event in enumerate(events):
-            time_delta = int(event[0])
-            x = event[1]
-            y = event[2]
-            keys = int(event[3])
-
-            if time_delta == -12345 and i == len(events) - 1:
-                rng_seed = keys
-                continue
+        if time_delta and int(time_delta[-1]) == -12345:
+            rng_seed = int(keys[-1])
+            for column in columns:
+                column.pop()
+
+        # I don't really know why these frames exist, but lazer removes them
+        # and they can cause issues for minigame replays - e.g., mania
+        # interprets x as keys.
+        # See
+        # https://github.com/ppy/osu/blob/6a04708a7e9801949c6c7ac7ddf6a4d7
+        # fa0835e5/osu.Game/Scoring/Legacy/LegacyScoreDecoder.cs#L290-L294.
+        for i in reversed(range(min(2, len(time_delta)))):
+            if float(x[i]) == 256 and float(y[i]) == -500:
+                for column in columns:
+                    del column[i]
+
+        return rng_seed
 
-            # I don't really know why these frames exist, but lazer removes them
-            # and they can cause issues for minigame replays - e.g., mania
-            # interprets x as keys.
-            # See
-            # https://github.com/ppy/osu/blob/6a04708a7e9801949c6c7ac7ddf6a4d7
-            # fa0835e5/osu.Game/Scoring/Legacy/LegacyScoreDecoder.cs#L290-L294.
-            if i < 2 and float(x) == 256 and float(y) == -500:
-                continue
+    @staticmethod
+    def build_events(columns, mode):
+        (time_delta, x, y, keys) = columns
+        time_delta = map(int, time_delta)
+
+        # a replay only has a handful of distinct key states, so convert each
+        # distinct string once instead of once per frame.
+        def convert(column, f):
+            lookup = {value: f(value) for value in set(column)}
+            return map(lookup.__getitem__, column)
+
+        if mode is GameMode.STD:
+            keys = convert(keys, lambda k: Key(int(k)))
+            events = map(ReplayEventOsu, time_delta, map(float, x),
+                map(float, y), keys)
+        if mode is GameMode.TAIKO:
+            keys = convert(keys, lambda k: KeyTaiko(int(k)))
+            events = map(ReplayEventTaiko, time_delta, map(int, x), keys)
+        if mode is GameMode.CTB:
+            dashing = convert(keys, lambda k: int(k) == 1)
+            events = map(ReplayEventCatch, time_delta, map(float, x), dashing)
+        if mode is GameMode.MANIA:
+            keys = convert(x, lambda k: KeyMania(int(k)))
+            events = map(ReplayEventMania, time_delta, keys)
+        return list(events)
 
-            if mode is GameMode.STD:
-                keys = Key(keys)
-                event = ReplayEventOsu(time_delta, float(x), float(y), keys)
-            if mode is GameMode.TAIKO:
-                event = ReplayEventTaiko(time_delta, int(x), KeyTaiko(keys))
-            if mode is GameMode.CTB:
-                event = ReplayEventCatch(time_delta, float(x), int(keys) == 1)
-            if mode is GameMode.MANIA:
-                event = ReplayEventMania(time_delta, KeyMania(int(x)))
+    @staticmethod
+    def iter_decompress(chunks, chunk_size):
+        decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_AUTO)
+        for chunk in chunks:
+            if decompressor.eof:
+                break
+            # limit how much we decompress at once, so that a highly
+            # compressible chunk doesn't blow up into a huge string.
+            data = decompressor.decompress(chunk, max_length=chunk_size)
+            yield data.decode("ascii")
+            while not decompressor.needs_input and not decompressor.eof:
+                data = decompressor.decompress(b"", max_length=chunk_size)
+                yield data.decode("ascii")
 
-            play_data.append(event)
+    @staticmethod
+    def iter_frame_strings(chunks):
+        remainder = ""
+        for chunk in chunks:
+            frames = (remainder + chunk).split(",")
+            # the last frame may continue into the next chunk
+            remainder = frames.pop()
+            for frame in frames:
+                if frame:
+                    yield frame
+        if remainder:
+            yield remainder
 
-        return (play_data, rng_seed)
+    @staticmethod
+    def parse_frame(frame, i, mode):
+        # see `parse_replay_data` for the reasoning behind the special cases
+        # in this function.
+        (time_delta, x, y, keys) = frame.split("|")
+        if i < 2 and float(x) == 256 and float(y) == -500:
+            return None
+
+        time_delta = int(time_delta)
+        if mode is GameMode.STD:
+            return ReplayEventOsu(time_delta, float(x), float(y),
+                Key(int(keys)))
+        if mode is GameMode.TAIKO:
+            return ReplayEventTaiko(time_delta, int(x), KeyTaiko(int(keys)))
+        if mode is GameMode.CTB:
+            return ReplayEventCatch(time_delta, float(x), int(keys) == 1)
+        if mode is GameMode.MANIA:
+            return ReplayEventMania(time_delta, KeyMania(int(x)))
+
+    @staticmethod
+    def iter_replay_frames(chunks):
+        # yields the frame strings of the replay data, without the rng seed
+        # frame.
+        frames = _Unpacker.iter_frame_strings(chunks)
+        # we hold each frame back until we've seen the next one, since only the
+        # last frame can be the rng seed frame.
+        previous = next(frames, None)
+        for frame in frames:
+            yield previous
+            previous = frame
+
+        if previous is not None and not previous.startswith("-12345|"):
+            yield previous
+
+    @staticmethod
+    def iter_replay_data(chunks, mode, start=None, stop=None):
+        frames = enumerate(_Unpacker.iter_replay_frames(chunks))
+        if start is None and stop is None:
+            for (i, frame) in frames:
+                event = _Unpacker.parse_frame(frame, i, mode)
+                if event is not None:
+                    yield event
+            return
+
+        # only the time delta of frames outside of the window is parsed, and
+        # we stop (and so stop decompressing) as soon as we're past it.
+        time_ = 0
+        for (i, frame) in frames:
+            if i < 2 and _Unpacker.parse_frame(frame, i, mode) is None:
+                continue
+            time_ += int(frame[:frame.index("|")])
+            if stop is not None and time_ >= stop:
+                return
+            if start is None or time_ >= start:
+                yield _Unpacker.parse_frame(frame, i, mode)
+
+    def locate_play_data(self):
+        # jumps to the start of the compressed replay data, and returns the
+        # mode and the length of the compressed replay data.
+        (mode, _game_version) = self.unpack_struct(_PREAMBLE)
+        mode = GameMode(mode)
+        self.skip_string()
+        self.skip_string()
+        self.skip_string()
+        self.offset += _STATS.size
+        self.skip_string()
+        self.offset += _LONG.size
+        replay_length = self.unpack_int()
+        return (mode, replay_length)
 
     def unpack_replay_id(self):
         # old replays had replay_id stored as an int32 (4 bytes) instead of a
@@ -150,50 +364,99 @@ class _Unpacker:
 
         return [LifeBarState(int(s[0]), float(s[1])) for s in states]
 
-    def unpack(self):
-        mode = GameMode(self.unpack_byte())
-        game_version = self.unpack_int()
+    def unpack_fields(self):
+        # every field before the life bar, in order
+        (mode, game_version) = self.unpack_struct(_PREAMBLE)
+        mode = GameMode(mode)
         beatmap_hash = self.unpack_string()
         username = self.unpack_string()
         replay_hash = self.unpack_string()
-        count_300 = self.unpack_short()
-        count_100 = self.unpack_short()
-        count_50 = self.unpack_short()
-        count_geki = self.unpack_short()
-        count_katu = self.unpack_short()
-        count_miss = self.unpack_short()
-        score = self.unpack_int()
-        max_combo = self.unpack_short()
-        perfect = self.unpack_byte()
-        mods = Mod(self.unpack_int())
+        (count_300, count_100, count_50, count_geki, count_katu, count_miss,
+            score, max_combo, perfect, mods) = self.unpack_struct(_STATS)
+        mods = Mod(mods)
+        return (mode, game_version, beatmap_hash, username, replay_hash,
+            count_300, count_100, count_50, count_geki, count_katu, count_miss,
+            score, max_combo, perfect, mods)
+
+    def unpack(self, *, frames=True):
+        (mode, game_version, beatmap_hash, username, replay_hash, count_300,
+            count_100, count_50, count_geki, count_katu, count_miss, score,
+            max_combo, perfect, mods) = self.unpack_fields()
+
+        if not frames:
+            self.skip_string()
+            timestamp = self.unpack_timestamp()
+            self.skip_play_data()
+            replay_id = self.unpack_replay_id()
+
+            return ReplayHeader(mode, game_version, beatmap_hash, username,
+                replay_hash, count_300, count_100, count_50, count_geki,
+                count_katu, count_miss, score, max_combo, perfect, mods,
+                timestamp, replay_id)
+
         life_bar_graph = self.unpack_life_bar()
         timestamp = self.unpack_timestamp()
-        (replay_data, rng_seed) = self.unpack_play_data(mode)
+        compressed_frames = self.unpack_play_data()
         replay_id = self.unpack_replay_id()
 
-        return Replay(mode, game_version, beatmap_hash, username,
+        replay = Replay(mode, game_version, beatmap_hash, username,
             replay_hash, count_300, count_100, count_50, count_geki, count_katu,
             count_miss, score, max_combo, perfect, mods, life_bar_graph,
-            timestamp, replay_data, replay_id, rng_seed)
+            timestamp, None, replay_id, None)
+        replay._compressed_frames = compressed_frames
+        return replay
+
+
+# named lzma settings for compressing replay data, trading off compression time
+# against size. The dictionary size is kept at 2 MiB for every profile, since
+# the replay data of even long replays fits comfortably, and decoders (osu!
+# included) allocate the full dictionary up front.
+LZMA_PROFILES = {
+    "fast": {"preset": 1, "dict_size": 1 << 21},
+    "default": {"dict_size": 1 << 21, "mode": lzma.MODE_FAST},
+    "small": {"preset": 9 | lzma.PRESET_EXTREME, "dict_size": 1 << 21}
+}
 
 
 class _Packer:
-    def __init__(self, replay, *, dict_size=None, mode=None):
+    # how many frames to format at a time when compressing incrementally
+    CHUNK_FRAMES = 4096
+    # how much compressed replay data to hold in memory when writing to an
+    # unseekable file, before spilling to disk
+    SPOOL_SIZE = 1 << 20
+
+    def __init__(self, replay, *, dict_size=None, mode=None, frames=None,
+        profile=None):
         self.replay = replay
-        self.dict_size = dict_size or 1 << 21
-        self.mode = mode or lzma.MODE_FAST
+        self.frames = frames
+        # if the caller asked for specific lzma settings, we can't reuse the
+        # replay's original compressed replay data.
+        self.recompress = (dict_size is not None or mode is not None or
+            profile is not None)
+
+        if profile not in LZMA_PROFILES and profile is not None:
+            raise ValueError(f"Expected profile to be one of "
+                f"{list(LZMA_PROFILES)}, got {profile!r}")
+        self.filter = {
+            "id": lzma.FILTER_LZMA1,
+            **LZMA_PROFILES[profile or "default"]
+        }
+        if dict_size is not None:
+            self.filter["dict_size"] = dict_size
+        if mode is not None:
+            self.filter["mode"] = mode
 
     def pack_byte(self, data):
-        return struct.pack("<B", data)
+        return _BYTE.pack(data)
 
     def pack_short(self, data):
-        return struct.pack("<H", data)
+        return _SHORT.pack(data)
 
     def pack_int(self, data):
-        return struct.pack("<I", data)
+        return _INT.pack(data)
 
     def pack_long(self, data):
-        return struct.pack("<q", data)
+        return _LONG.pack(data)
 
     def pack_ULEB128(self, data):
         # https://github.com/mohanson/leb128
@@ -205,7 +468,7 @@ class _Packer:
 
             if (i == 0 and byte & 0x40 == 0) or (i == -1 and byte & 0x40 != 0):
                 r.append(byte)
-                return b"".join(map(self.pack_byte, r))
+                return bytes(r)
 
             r.append(0x80 | byte)
 
@@ -216,85 +479,295 @@ class _Packer:
         return self.pack_byte(11) + self.pack_byte(0)
 
     def pack_timestamp(self):
-        # windows ticks starts at year 0001, in contrast to unix time (1970).
-        # 62135596800 is the number of seconds between these two years and is
-        # added to account for this difference.
-        # The factor of 10000000 converts seconds to ticks.
-
-        ticks = (62135596800 + self.replay.timestamp.timestamp()) * 10000000
-        ticks = int(ticks)
+        # windows ticks starts at year 0001, in contrast to unix time (1970),
+        # and a tick is 100 nanoseconds. Computed with timedeltas rather than
+        # `datetime.timestamp`, since a float loses precision for timestamps
+        # far from 1970.
+        timestamp = self.replay.timestamp
+        if timestamp.tzinfo is None:
+            # naive datetimes are interpreted as local time, to match
+            # `datetime.timestamp`.
+            timestamp = timestamp.astimezone(timezone.utc)
+        delta = timestamp - datetime.min.replace(tzinfo=timezone.utc)
+        ticks = (delta // timedelta(microseconds=1)) * 10
         return self.pack_long(ticks)
 
     def pack_life_bar(self):
-        data = ""
         if self.replay.life_bar_graph is None:
-            return self.pack_string(data)
+            return self.pack_string("")
 
+        states = []
         for state in self.replay.life_bar_graph:
             life = state.life
             # store 0 or 1 instead of 0.0 or 1.0
             if int(life) == life:
                 life = int(state.life)
-
-            data += f"{state.time}|{life},"
-
-        return self.pack_string(data)
+            states.append(f"{state.time}|{life},")
+
+        return self.pack_string("".join(states))
+
+    def format_events(self, events):
+        # dispatch on the mode once, and build the string with a single join
+        # instead of repeated concatenation. %-formatting is the fastest way
+        # to format a frame. `%s` (unlike `%r`) formats float-likes such as
+        # numpy floats as their value.
+        mode = self.replay.mode
+        if mode is GameMode.STD:
+            data = ["%d|%s|%s|%d," % (e.time_delta, e.x, e.y, e.keys)
+                for e in events]
+        if mode is GameMode.TAIKO:
+            data = ["%d|%s|0|%d," % (e.time_delta, e.x, e.keys)
+                for e in events]
+        if mode is GameMode.CTB:
+            data = ["%d|%s|0|%d," % (e.time_delta, e.x, e.dashing)
+                for e in events]
+        if mode is GameMode.MANIA:
+            data = ["%d|%d|0|0," % (e.time_delta, e.keys) for e in events]
+        return "".join(data)
+
+    def iter_replay_data_text(self):
+        if self.frames is not None:
+            # numpy is an optional dependency, so only import it if we need to
+            from osrparse.frames import format_frames
+            frames = self.frames
+            format_ = lambda frames: format_frames(frames, self.replay.mode)
+        else:
+            frames = self.replay.replay_data
+            format_ = self.format_events
+
+        for i in range(0, len(frames), self.CHUNK_FRAMES):
+            yield format_(frames[i:i + self.CHUNK_FRAMES])
+
+        # when writing frames, the replay data of the replay may never have
+        # been parsed. Don't parse it just to find the rng seed.
+        rng_seed = (self.replay._frames_rng_seed() if self.frames is not None
+            else self.replay.rng_seed)
+        if rng_seed is not None:
+            yield f"-12345|0|0|{rng_seed},"
+
+    def iter_compressed_replay_data(self):
+        compressed = self.replay._compressed_frames
+        if (compressed is not None and not self.recompress and
+            self.frames is None):
+            # the replay data was never accessed, and so can't have been
+            # modified. Save ourselves from recompressing it.
+            yield compressed
+            return
+
+        compressor = lzma.LZMACompressor(format=lzma.FORMAT_ALONE,
+            filters=[self.filter])
+        for data in self.iter_replay_data_text():
+            yield self.compress(compressor, data)
+        yield self.compress(compressor, None)
+
+    def compress(self, compressor, data):
+        # compresses a chunk of replay data text, or flushes the compressor if
+        # `data` is None. Its own method so that `osrparse.profiling` can time
+        # compression separately from formatting.
+        if data is None:
+            return compressor.flush()
+        return compressor.compress(data.encode("ascii"))
 
     def pack_replay_data(self):
-        data = ""
-        for event in self.replay.replay_data:
-            t = event.time_delta
-            if isinstance(event, ReplayEventOsu):
-                data += f"{t}|{event.x}|{event.y}|{event.keys.value},"
-            elif isinstance(event, ReplayEventTaiko):
-                data += f"{t}|{event.x}|0|{event.keys.value},"
-            elif isinstance(event, ReplayEventCatch):
-                data += f"{t}|{event.x}|0|{int(event.dashing)},"
-            elif isinstance(event, ReplayEventMania):
-                data += f"{t}|{event.keys.value}|0|0,"
-
-        if self.replay.rng_seed:
-            data += f"-12345|0|0|{self.replay.rng_seed},"
-
-        filters = [
-            {
-                "id": lzma.FILTER_LZMA1,
-                "dict_size": self.dict_size,
-                "mode": self.mode
-            }
-        ]
-
-        data = data.encode("ascii")
-        compressed = lzma.compress(data, format=lzma.FORMAT_ALONE,
-            filters=filters)
-
+        compressed = b"".join(self.iter_compressed_replay_data())
         return self.pack_int(len(compressed)) + compressed
 
-    def pack(self):
+    def write_replay_data(self, file, *, seek):
+        # the compressed replay data is prefixed with its length, which we
+        # don't know until we're done compressing. Write a placeholder and
+        # come back to it if `seek` is set, or buffer the compressed data
+        # otherwise. Only files we opened ourselves are known to support
+        # this; files which claim to be seekable may still not be able to
+        # seek backwards (gzip) or write where they seek to (append mode).
+        if seek:
+            start = file.tell()
+            file.write(self.pack_int(0))
+            length = 0
+            for data in self.iter_compressed_replay_data():
+                file.write(data)
+                length += len(data)
+            end = file.tell()
+            file.seek(start)
+            file.write(self.pack_int(length))
+            file.seek(end)
+            return
+
+        with tempfile.SpooledTemporaryFile(self.SPOOL_SIZE) as spool:
+            for data in self.iter_compressed_replay_data():
+                spool.write(data)
+            file.write(self.pack_int(spool.tell()))
+            spool.seek(0)
+            shutil.copyfileobj(spool, file)
+
+    def pack_header(self):
+        # everything before the replay data
         r = self.replay
-        data = b""
-
-        data += self.pack_byte(r.mode.value)
-        data += self.pack_int(r.game_version)
-        data += self.pack_string(r.beatmap_hash)
-        data += self.pack_string(r.username)
-        data += self.pack_string(r.replay_hash)
-        data += self.pack_short(r.count_300)
-        data += self.pack_short(r.count_100)
-        data += self.pack_short(r.count_50)
-        data += self.pack_short(r.count_geki)
-        data += self.pack_short(r.count_katu)
-        data += self.pack_short(r.count_miss)
-        data += self.pack_int(r.score)
-        data += self.pack_short(r.max_combo)
-        data += self.pack_byte(r.perfect)
-        data += self.pack_int(r.mods.value)
-        data += self.pack_life_bar()
-        data += self.pack_timestamp()
-        data += self.pack_replay_data()
-        data += self.pack_long(r.replay_id)
+        return b"".join([
+            _PREAMBLE.pack(r.mode.value, r.game_version),
+            self.pack_string(r.beatmap_hash),
+            self.pack_string(r.username),
+            self.pack_string(r.replay_hash),
+            _STATS.pack(r.count_300, r.count_100, r.count_50, r.count_geki,
+                r.count_katu, r.count_miss, r.score, r.max_combo, r.perfect,
+                r.mods.value),
+            self.pack_life_bar(),
+            self.pack_timestamp()
+        ])
 
-        return data
+    def pack(self):
+        return b"".join([
+            self.pack_header(),
+            self.pack_replay_data(),
+            self.pack_long(self.replay.replay_id)
+        ])
+
+    def write(self, file, *, seek=False):
+        file.write(self.pack_header())
+        self.write_replay_data(file, seek=seek)
+        file.write(self.pack_long(self.replay.replay_id))
+
+
+def _read_header(file, chunk_size):
+    # reads from `file` until we've read the whole header, and returns the
+    # data read, the mode, the offset of the compressed replay data in the
+    # data read, and its length. We don't know how long the header is up
+    # front, so keep reading until we can parse it.
+    data = b""
+    while True:
+        chunk = file.read(chunk_size)
+        data += chunk
+        unpacker = _Unpacker(data)
+        try:
+            (mode, replay_length) = unpacker.locate_play_data()
+            return (data, mode, unpacker.offset, replay_length)
+        except (IndexError, struct.error):
+            if not chunk:
+                raise ValueError("Unexpected end of file while reading the "
+                    "replay header") from None
+        finally:
+            unpacker.release()
+
+
+def _iter_play_data(file, chunk_size):
+    # yields the mode of the replay in `file`, followed by its compressed
+    # replay data in chunks.
+    (data, mode, offset, replay_length) = _read_header(file, chunk_size)
+    yield mode
+    data = data[offset:offset + replay_length]
+    remaining = replay_length - len(data)
+    yield data
+    while remaining > 0:
+        chunk = file.read(min(chunk_size, remaining))
+        if not chunk:
+            raise ValueError("Unexpected end of file while reading the "
+                "replay data")
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _iter_frames(file, chunk_size, start, stop):
+    chunks = _iter_play_data(file, chunk_size)
+    mode = next(chunks)
+    chunks = _Unpacker.iter_decompress(chunks, chunk_size)
+    yield from _Unpacker.iter_replay_data(chunks, mode, start, stop)
+
+
+@dataclass
+class ReplayHeader:
+    """
+    The header of a replay, ie every attribute of a ``Replay`` except those
+    which require decompressing the replay data. To create a replay header,
+    pass ``frames=False`` to ``Replay.from_path``, ``Replay.from_file``, or
+    ``Replay.from_string``.
+
+    Attributes
+    ----------
+    mode: GameMode
+        The game mode this replay was played on.
+    game_version: int
+        The game version this replay was played on.
+    beatmap_hash: str
+        The hash of the beatmap this replay was played on.
+    username: str
+        The user that played this replay.
+    replay_hash:
+        The hash of this replay.
+    count_300: int
+        The number of 300 judgments in this replay.
+    count_100: int
+        The number of 100 judgments in this replay.
+    count_50: int
+        The number of 50 judgments in this replay.
+    count_geki: int
+        The number of geki judgments in this replay.
+    count_katu: int
+        The number of katu judgments in this replay.
+    count_miss: int
+        The number of misses in this replay.
+    score: int
+        The score of this replay.
+    max_combo: int
+        The maximum combo attained in this replay.
+    perfect: bool
+        Whether this replay was perfect or not.
+    mods: Mod
+        The mods this replay was played with.
+    timestamp: datetime
+        When this replay was played.
+    replay_id: int
+        The replay id of this replay, or 0 if not submitted.
+
+    Notes
+    -----
+    The life bar graph is skipped over as well, since parsing it is wasted
+    work for the typical use case of a header (indexing large amounts of
+    replays).
+    """
+    mode: GameMode
+    game_version: int
+    beatmap_hash: str
+    username: str
+    replay_hash: str
+    count_300: int
+    count_100: int
+    count_50: int
+    count_geki: int
+    count_katu: int
+    count_miss: int
+    score: int
+    max_combo: int
+    perfect: bool
+    mods: Mod
+    timestamp: datetime
+    replay_id: int
+
+
+class _LazyFrameAttribute:
+    """
+    Descriptor for the attributes of a ``Replay`` which are only known after
+    decompressing its replay data, ie ``replay_data`` and ``rng_seed``.
+    """
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = "_" + name
+
+    def __get__(self, replay, owner=None):
+        if replay is None:
+            # dataclasses looks up the class attribute to find a field's
+            # default. Raising here tells it that there is no default.
+            raise AttributeError(self.name)
+        if replay._compressed_frames is not None:
+            replay._decompress_frames()
+        return getattr(replay, self.private_name)
+
+    def __set__(self, replay, value):
+        # decompress first so that assigning one lazy attribute doesn't
+        # discard the other.
+        if replay._compressed_frames is not None:
+            replay._decompress_frames()
+        setattr(replay, self.private_name, value)
+        # the seek index was built from the old replay data
+        replay._frame_times = None
 
 
 @dataclass
@@ -346,6 +819,14 @@ class Replay:
     rng_seed: Optional[int]
         The rng seed of this replay, or ``None`` if not present (typically not
         present on older replays).
+
+    Notes
+    -----
+    When parsed from a ``.osr`` file, ``replay_data`` and ``rng_seed`` are
+    lazy: the replay data is only decompressed and parsed the first time
+    either attribute is accessed. If neither is ever accessed, writing the
+    replay reuses the original compressed replay data instead of compressing
+    it again.
     """
     mode: GameMode
     game_version: int
@@ -364,12 +845,42 @@ class Replay:
     mods: Mod
     life_bar_graph: Optional[List[LifeBarState]]
     timestamp: datetime
-    replay_data: List[ReplayEvent]
+    replay_data: List[ReplayEvent] = _LazyFrameAttribute()
     replay_id: int
-    rng_seed: Optional[int]
+    rng_seed: Optional[int] = _LazyFrameAttribute()
+
+    # the compressed replay data this replay was parsed from, until it is
+    # decompressed. Not a dataclass field.
+    _compressed_frames = None
+    # the seek index used by `frame_at`, built on first use. Not a dataclass
+    # field.
+    _frame_times = None
+    # the rng seed in the compressed replay data, if it was found without
+    # parsing the replay data (see `_frames_rng_seed`). Not a dataclass field.
+    _compressed_rng_seed = _UNKNOWN
+
+    def _decompress_frames(self):
+        (replay_data, rng_seed) = _Unpacker.decompress_play_data(
+            self._compressed_frames, self.mode)
+        # clear the compressed replay data last, so that another thread
+        # reading replay data in the meantime decompresses it again rather
+        # than finding neither it nor the parsed replay data
+        self._replay_data = replay_data
+        self._rng_seed = rng_seed
+        self._compressed_frames = None
+
+    def _frames_rng_seed(self):
+        # the rng seed of this replay. Unlike `rng_seed`, doesn't create an
+        # event for every frame if the replay data hasn't been parsed yet.
+        if self._compressed_frames is None:
+            return self.rng_seed
+        if self._compressed_rng_seed is _UNKNOWN:
+            data = _Unpacker.decompress(self._compressed_frames)
+            self._compressed_rng_seed = _Unpacker.find_rng_seed(data)
+        return self._compressed_rng_seed
 
     @staticmethod
-    def from_path(path):
+    def from_path(path, *, frames=True, mmap=False):
         """
         Creates a new ``Replay`` object from the ``.osr`` file at the given
         ``path``.
@@ -378,17 +889,27 @@ class Replay:
         ----------
         path: str or os.PathLike
             The path to the osr file to read from.
+        frames: bool
+            Whether to parse the replay data. If ``False``, only the header of
+            the replay is parsed, and a ``ReplayHeader`` is returned instead.
+        mmap: bool
+            Whether to memory map the file instead of reading it. Combined
+            with ``frames=False``, only the pages of the file containing the
+            header are ever read, and nothing is copied into python memory.
 
         Returns
         -------
-        Replay
-            The parsed replay object.
+        Replay or ReplayHeader
+            The parsed replay object, or its header if ``frames`` is ``False``.
         """
         with open(path, "rb") as f:
-            return Replay.from_file(f)
+            if not mmap:
+                return Replay.from_file(f, frames=frames)
+            with mmap_.mmap(f.fileno(), 0, access=mmap_.ACCESS_READ) as m:
+                return Replay.from_string(m, frames=frames)
 
     @staticmethod
-    def from_file(file):
+    def from_file(file, *, frames=True):
         """
         Creates a new ``Replay`` object from an open file object.
 
@@ -396,33 +917,242 @@ class Replay:
         ----------
         file: file-like
            The file object to read from.
+        frames: bool
+            Whether to parse the replay data. If ``False``, only the header of
+            the replay is parsed, and a ``ReplayHeader`` is returned instead.
 
         Returns
         -------
-        Replay
-            The parsed replay object.
+        Replay or ReplayHeader
+            The parsed replay object, or its header if ``frames`` is ``False``.
+
+        Notes
+        -----
+        With ``frames=False``, a seekable file is only read up to the end of
+        the header, and then seeks over the compressed replay data instead of
+        reading it.
         """
-        data = file.read()
-        return Replay.from_string(data)
+        seekable = getattr(file, "seekable", None)
+        if frames or seekable is None or not seekable():
+            data = file.read()
+            return Replay.from_string(data, frames=frames)
+
+        (data, _mode, offset, replay_length) = _read_header(file, 1 << 12)
+        # we likely read a little past the start of the replay data. Seek to
+        # the end of it, and read what follows (the replay id).
+        file.seek(offset + replay_length - len(data), io.SEEK_CUR)
+        tail = file.read()
+        # parse the header as if the replay data were empty
+        data = data[:offset - _INT.size] + _INT.pack(0) + tail
+        return Replay.from_string(data, frames=False)
 
     @staticmethod
-    def from_string(data):
+    def from_string(data, *, frames=True):
         """
         Creates a new ``Replay`` object from a string containing ``.osr`` data.
 
         Parameters
         ----------
-        data: str
-           The data to parse.
+        data: bytes-like
+           The data to parse. Any object supporting the buffer protocol (such
+           as ``bytes``, ``bytearray``, ``memoryview``, or ``mmap.mmap``) can
+           be parsed without being copied first.
+        frames: bool
+            Whether to parse the replay data. If ``False``, only the header of
+            the replay is parsed, and a ``ReplayHeader`` is returned instead.
+            This skips over the compressed replay data without decompressing
+            it, and is much faster than parsing the full replay.
+
+        Returns
+        -------
+        Replay or ReplayHeader
+            The parsed replay object, or its header if ``frames`` is ``False``.
+        """
+        unpacker = _Unpacker(data)
+        try:
+            return unpacker.unpack(frames=frames)
+        finally:
+            unpacker.release()
+
+    @staticmethod
+    async def afrom_path(path, *, frames=True, executor=None):
+        """
+        The asynchronous equivalent of ``Replay.from_path``. The file is read
+        and parsed in ``executor``, so the event loop is never blocked.
+
+        Parameters
+        ----------
+        path: str or os.PathLike
+            The path to the osr file to read from.
+        frames: bool
+            Whether to parse the replay data. See |from_path|.
+        executor: concurrent.futures.Executor
+            The executor to parse in. Defaults to the event loop's default
+            executor. See ``osrparse.aio.AsyncReplayParser``.
 
         Returns
         -------
-        Replay
-            The parsed replay object.
+        Replay or ReplayHeader
+            The parsed replay object, or its header if ``frames`` is ``False``.
+        """
+        # osrparse.aio imports this module
+        from osrparse.aio import afrom_path
+        return await afrom_path(path, frames=frames, executor=executor)
+
+    @staticmethod
+    def iter_frames(source, *, chunk_size=1 << 16, start=None, stop=None):
         """
-        return _Unpacker(data).unpack()
+        Iterates over the replay data of a replay, without ever holding all of
+        it in memory. The replay data is decompressed and parsed incrementally
+        as the iterator is advanced, so stopping early also stops
+        decompressing.
 
-    def write_path(self, path, *, dict_size=None, mode=None):
+        Parameters
+        ----------
+        source: str or os.PathLike or bytes-like or file-like
+            The path to the osr file to read from, the ``.osr`` data itself,
+            or an open file object to read from.
+        chunk_size: int
+            How many bytes to read and decompress at a time.
+        start: int
+            If passed, only yield events at or after this time, in
+            milliseconds from the start of the replay. No event is created for
+            the frames before it.
+        stop: int
+            If passed, only yield events before this time, in milliseconds
+            from the start of the replay. Decompressing stops at the first
+            frame at or after it.
+
+        Yields
+        ------
+        ReplayEvent
+            The events in the replay data of the replay, in order.
+
+        Notes
+        -----
+        The time of an event is the sum of the ``time_delta`` of every event
+        up to and including it. The replay data is assumed to be in order of
+        time, so a frame which goes back in time into the window after a
+        frame past ``stop`` is not yielded.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            yield from _iter_frames(io.BytesIO(source), chunk_size, start,
+                stop)
+        elif hasattr(source, "read"):
+            yield from _iter_frames(source, chunk_size, start, stop)
+        else:
+            with open(source, "rb") as f:
+                yield from _iter_frames(f, chunk_size, start, stop)
+
+    def frames_between(self, start_ms, end_ms):
+        """
+        Returns the events of this replay from ``start_ms`` (inclusive) to
+        ``end_ms`` (exclusive), in milliseconds from the start of the replay.
+
+        If the replay data has not been accessed yet, only as much of it is
+        decompressed as is needed to reach ``end_ms``, and events are only
+        created for the frames inside the window. The replay data stays
+        unparsed, so this is much faster than slicing ``replay_data`` when
+        the window is near the start of a long replay.
+
+        Parameters
+        ----------
+        start_ms: int
+            The time to start at.
+        end_ms: int
+            The time to stop at.
+
+        Returns
+        -------
+        List[ReplayEvent]
+            The events in the window, in order. See |iter_frames| for how the
+            time of an event is determined.
+        """
+        if self._compressed_frames is not None:
+            chunks = _Unpacker.iter_decompress([self._compressed_frames],
+                1 << 16)
+            return list(_Unpacker.iter_replay_data(chunks, self.mode,
+                start_ms, end_ms))
+
+        events = []
+        time_ = 0
+        for event in self.replay_data:
+            time_ += event.time_delta
+            if time_ >= end_ms:
+                break
+            if time_ >= start_ms:
+                events.append(event)
+        return events
+
+    def frame_at(self, time_ms):
+        """
+        Returns the event of this replay at ``time_ms``, ie the last event at
+        or before it, for seeking to a point in the replay.
+
+        The first call builds a seek index of the time of every event, which
+        takes about as long as walking ``replay_data`` once. Every later call
+        is a binary search of that index. The index is rebuilt if
+        ``replay_data`` is assigned to or changes length, but not if its
+        events are replaced in place.
+
+        Parameters
+        ----------
+        time_ms: int
+            The time to seek to, in milliseconds from the start of the replay.
+
+        Returns
+        -------
+        Optional[ReplayEvent]
+            The event at ``time_ms``, or ``None`` if ``time_ms`` is before the
+            first event.
+
+        Notes
+        -----
+        The time of an event is the sum of the ``time_delta`` of every event
+        up to and including it. If the replay goes back in time (which a few
+        frames in real replays do), each event is treated as happening at the
+        latest time seen up to it, so that the index stays sorted.
+        """
+        replay_data = self.replay_data
+        times = self._frame_times
+        if times is None or len(times) != len(replay_data):
+            times = accumulate(accumulate(e.time_delta for e in replay_data),
+                max)
+            # a compact array of integers, rather than a list of python ints
+            times = self._frame_times = array("q", times)
+        i = bisect_right(times, time_ms) - 1
+        if i < 0:
+            return None
+        return replay_data[i]
+
+    def frames_array(self):
+        """
+        Returns the replay data of this replay as a numpy structured array,
+        with one field per column (see ``osrparse.frames.FRAME_DTYPES``).
+        Requires numpy.
+
+        If the replay data has not been accessed yet, it is parsed directly
+        into the array, without creating a ``ReplayEvent`` for each frame.
+
+        Returns
+        -------
+        np.ndarray
+            The replay data of this replay.
+        """
+        # numpy is an optional dependency, so only import it if we need to
+        from osrparse.frames import parse_frames, frames_from_events
+
+        if self._compressed_frames is not None:
+            data = _Unpacker.decompress(self._compressed_frames)
+            (frames, rng_seed) = parse_frames(data, self.mode)
+            # so that writing these frames back doesn't have to parse the
+            # replay data again to find the rng seed
+            self._compressed_rng_seed = rng_seed
+            return frames
+        return frames_from_events(self.replay_data, self.mode)
+
+    def write_path(self, path, *, dict_size=None, mode=None, frames=None,
+        profile=None):
         """
         Writes the replay to the given ``path``.
 
@@ -430,6 +1160,19 @@ class Replay:
         ----------
         path: str or os.PathLike
            The path to where to write the replay.
+        dict_size: int
+            The lzma dictionary size to compress the replay data with.
+            Overrides ``profile``.
+        mode: int
+            The lzma mode (``lzma.MODE_FAST`` or ``lzma.MODE_NORMAL``) to
+            compress the replay data with. Overrides ``profile``.
+        frames: np.ndarray
+            If passed, write these frames (as returned by ``frames_array``)
+            instead of ``replay_data``.
+        profile: str
+            The lzma settings to compress the replay data with. One of
+            ``"fast"``, ``"default"``, or ``"small"``. See
+            ``LZMA_PROFILES``.
 
         Notes
         -----
@@ -438,36 +1181,66 @@ class Replay:
         an attribute, then writing the replay back to its file.
         """
         with open(path, "wb") as f:
-            self.write_file(f, dict_size=dict_size, mode=mode)
+            _Packer(self, dict_size=dict_size, mode=mode, frames=frames,
+                profile=profile).write(f, seek=True)
 
-    def write_file(self, file, *, dict_size=None, mode=None):
+    def write_file(self, file, *, dict_size=None, mode=None, frames=None,
+        profile=None):
         """
         Writes the replay to an open file object.
 
+        The replay data is compressed incrementally, and buffered (spilling
+        to a temporary file if large) so that its length can be written
+        first, so the packed replay is never held in memory all at once.
+        ``file`` only needs to support ``write``; it is never seeked, so
+        compressed and append mode files work too.
+
         Parameters
         ----------
         file: file-like
            The file object to write to.
+        dict_size: int
+            See |write_path|.
+        mode: int
+            See |write_path|.
+        frames: np.ndarray
+            If passed, write these frames (as returned by ``frames_array``)
+            instead of ``replay_data``.
+        profile: str
+            See |write_path|.
         """
-        packed = self.pack(dict_size=dict_size, mode=mode)
-        file.write(packed)
+        _Packer(self, dict_size=dict_size, mode=mode, frames=frames,
+            profile=profile).write(file)
 
-    def pack(self, *, dict_size=None, mode=None):
+    def pack(self, *, dict_size=None, mode=None, frames=None, profile=None):
         """
         Returns the text representing this ``Replay``, in ``.osr`` format.
         The text returned by this method is suitable for writing to a file as a
         valid ``.osr`` file.
 
+        Parameters
+        ----------
+        dict_size: int
+            See |write_path|.
+        mode: int
+            See |write_path|.
+        frames: np.ndarray
+            If passed, pack these frames (as returned by ``frames_array``)
+            instead of ``replay_data``.
+        profile: str
+            See |write_path|.
+
         Returns
         -------
         str
             The text representing this ``Replay``, in ``.osr`` format.
         """
-        return _Packer(self, dict_size=dict_size, mode=mode).pack()
+        return _Packer(self, dict_size=dict_size, mode=mode,
+            frames=frames, profile=profile).pack()
 
 
 def parse_replay_data(data_string, *, decoded=False, decompressed=False,
-    mode=GameMode.STD) -> List[ReplayEvent]:
+    mode=GameMode.STD, cache=None) -> List[ReplayEvent]:
     """
     Parses the replay data portion of a replay from a string. This method is
     siutable for use with the replay data returned by api v1's ``/get_replay``
@@ -497,7 +1270,16 @@ def parse_replay_data(data_string, *, decoded=False, decompressed=False,
         ``data_string`` is not base 64 encoded).
     mode: GameMode
         What mode to parse the replay data as.
+    cache: ReplayDataCache
+        If passed, the parsed replay data is memoized in this cache (see
+        ``osrparse.cache.ReplayDataCache``), and parsing the same data again
+        only costs hashing it and building its events.
     """
+    if cache is not None:
+        key = (data_string, decoded, decompressed, mode)
+        return cache._get(key, lambda: parse_replay_data(data_string,
+            decoded=decoded, decompressed=decompressed, mode=mode))
+
     # assume the data is already decoded if it's been decompressed
     if not decoded and not decompressed:
         data_string = base64.b64decode(data_string)
@@ -506,3 +1288,49 @@ def parse_replay_data(data_string, *, decoded=False, decompressed=False,
         data_string = data_string.decode("ascii")
     (replay_data, _seed) = _Unpacker.parse_replay_data(data_string, mode)
     return replay_data
+
+
+def iter_replay_data(data_string, *, decoded=False, decompressed=False,
+    mode=GameMode.STD, chunk_size=1 << 16, start=None,
+    stop=None) -> Iterator[ReplayEvent]:
+    """
+    Iterates over the replay data portion of a replay, decompressing and
+    parsing it incrementally. This is the streaming equivalent of
+    |parse_replay_data|, and takes the same arguments.
+
+    Parameters
+    ----------
+    data_string: str or bytes
+        The replay data to parse.
+    decoded: bool
+        Whether ``data_string`` has already been decoded from a b64
+        representation.
+    decompressed: bool
+        Whether ``data_string`` has already been both decompressed from lzma,
+        and decoded to ascii.
+    mode: GameMode
+        What mode to parse the replay data as.
+    chunk_size: int
+        How many bytes to decompress at a time.
+    start: int
+        If passed, only yield events at or after this time. See
+        |iter_frames|.
+    stop: int
+        If passed, only yield events before this time. See |iter_frames|.
+
+    Yields
+    ------
+    ReplayEvent
+        The events in the replay data, in order.
+    """
+    if decompressed:
+        yield from _Unpacker.iter_replay_data([data_string], mode, start,
+            stop)
+        return
+    if not decoded:
+        data_string = base64.b64decode(data_string)
+
+    data = memoryview(data_string)
+    chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+    chunks = _Unpacker.iter_decompress(chunks, chunk_size)
+    yield from _Unpacker.iter_replay_data(chunks, mode, start, stop)
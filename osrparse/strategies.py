@@ -29,21 +29,30 @@ life_bar_states = builds(
     life=representable_floats()
 )
 
+def time_deltas():
+    # a frame with a time_delta of -12345 is how the osr format stores the rng
+    # seed, and so can't be a regular frame.
+    return integers().filter(lambda t: t != -12345)
+
 replay_events_osu = builds(
     ReplayEventOsu,
+    time_delta=time_deltas(),
     x=representable_floats(),
     y=representable_floats()
 )
 replay_events_taiko = builds(
-    ReplayEventTaiko
+    ReplayEventTaiko,
+    time_delta=time_deltas()
 )
 
 replay_events_mania = builds(
-    ReplayEventMania
+    ReplayEventMania,
+    time_delta=time_deltas()
 )
 
 replay_events_catch = builds(
     ReplayEventCatch,
+    time_delta=time_deltas(),
     x=representable_floats()
 )
 
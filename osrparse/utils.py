@@ -104,6 +104,9 @@ class ReplayEvent:
     time_delta: int
         The time since the previous event (ie frame).
     """
+    # replays hold tens of thousands of events, so avoid giving each one a
+    # __dict__.
+    __slots__ = ("time_delta",)
     time_delta: int
 
 @dataclass
@@ -122,6 +125,7 @@ class ReplayEventOsu(ReplayEvent):
     keys: Key
         The keys pressed.
     """
+    __slots__ = ("x", "y", "keys")
     x: float
     y: float
     keys: Key
@@ -141,6 +145,7 @@ class ReplayEventTaiko(ReplayEvent):
     keys: KeyTaiko
         The keys pressed.
     """
+    __slots__ = ("x", "keys")
     # we have no idea what this is supposed to represent. It's always one of 0,
     # 320, or 640, depending on `keys`. Leaving untouched for now.
     x: int
@@ -160,6 +165,7 @@ class ReplayEventCatch(ReplayEvent):
     dashing: bool
         Whether we are dashing or not.
     """
+    __slots__ = ("x", "dashing")
     x: float
     dashing: bool
 
@@ -175,6 +181,7 @@ class ReplayEventMania(ReplayEvent):
     keys: KeyMania
         The keys pressed.
     """
+    __slots__ = ("keys",)
     keys: KeyMania
 
 @dataclass
@@ -191,5 +198,6 @@ class LifeBarState:
     life: float
         The amount of life at this life bar state.
     """
+    __slots__ = ("time", "life")
     time: int
     life: float
@@ -0,0 +1,72 @@
+import asyncio
+import base64
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import TestCase
+
+from osrparse import (Replay, AsyncReplayParser, aparse_replay_data,
+    aparse_many, parse_replay_data)
+
+RES = Path(__file__).parent / "resources"
+
+class TestAsync(TestCase):
+
+    def test_afrom_path(self):
+        async def run():
+            replay = await Replay.afrom_path(RES / "replay.osr")
+            # the replay data was parsed off the event loop
+            self.assertIsNone(replay._compressed_frames)
+            self.assertEqual(replay, Replay.from_path(RES / "replay.osr"))
+
+            with ProcessPoolExecutor(1) as executor:
+                replay = await Replay.afrom_path(RES / "taiko.osr",
+                    executor=executor)
+            self.assertEqual(replay, Replay.from_path(RES / "taiko.osr"))
+        asyncio.run(run())
+
+    def test_aparse_replay_data(self):
+        replay = Replay.from_path(RES / "mania.osr")
+        data = base64.b64encode(replay._compressed_frames)
+
+        async def run():
+            return await aparse_replay_data(data, mode=replay.mode)
+        self.assertEqual(asyncio.run(run()),
+            parse_replay_data(data, mode=replay.mode))
+
+    def test_aparse_many(self):
+        paths = sorted(RES.glob("*.osr"))
+
+        async def uploads():
+            for path in paths:
+                await asyncio.sleep(0)
+                yield path
+            yield RES / "missing.osr"
+
+        async def run():
+            results = [result async for result in aparse_many(RES, limit=2)]
+            self.assertEqual([path for (path, _) in results], paths)
+            for (path, replay) in results:
+                self.assertEqual(replay, Replay.from_path(path))
+
+            parser = AsyncReplayParser(limit=2)
+            results = {path: result async for (path, result) in
+                parser.parse_many(uploads(), ordered=False, frames=False)}
+            self.assertEqual(set(results), {*paths, RES / "missing.osr"})
+            self.assertIsInstance(results[RES / "missing.osr"],
+                FileNotFoundError)
+
+            # stopping early doesn't parse the rest
+            async for _ in parser.parse_many(paths):
+                break
+        asyncio.run(run())
+
+    def test_lazy_import(self):
+        # importing osrparse doesn't import asyncio until the async api is
+        # used
+        code = ("import sys, osrparse; "
+            "assert 'asyncio' not in sys.modules; "
+            "osrparse.aparse_many; "
+            "assert 'asyncio' in sys.modules")
+        subprocess.run([sys.executable, "-c", code], check=True)
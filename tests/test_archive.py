@@ -0,0 +1,76 @@
+import lzma
+import struct
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from osrparse import Replay, ReplayHeader, ArchiveWriter, ArchiveReader
+
+RES = Path(__file__).parent / "resources"
+
+class TestArchive(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._replays = [Replay.from_path(path) for path in
+            sorted(RES.glob("*.osr"))]
+
+    def test_round_trip(self):
+        with TemporaryDirectory() as d:
+            path = Path(d) / "replays.osra"
+            with ArchiveWriter(path) as writer:
+                for replay in self._replays:
+                    writer.add(replay)
+
+            with ArchiveReader(path) as reader:
+                self.assertEqual(len(reader), len(self._replays))
+                self.assertEqual(list(reader), self._replays)
+                for (header, replay) in zip(reader.headers, self._replays):
+                    self.assertIsInstance(header, ReplayHeader)
+                    self.assertEqual(header.replay_hash, replay.replay_hash)
+                # packing a replay read from an archive gives the same osr as
+                # packing the original replay
+                self.assertEqual(reader[-1].pack(), self._replays[-1].pack())
+
+    def test_lookup(self):
+        f = BytesIO()
+        with ArchiveWriter(f) as writer:
+            for replay in self._replays:
+                writer.add(replay)
+
+        reader = ArchiveReader(f)
+        replay = self._replays[2]
+        self.assertEqual(reader.by_replay_hash(replay.replay_hash), replay)
+        with self.assertRaises(KeyError):
+            reader.by_replay_hash("not a hash")
+
+        expected = [r for r in self._replays
+            if r.beatmap_hash == replay.beatmap_hash]
+        self.assertEqual(reader.by_beatmap_hash(replay.beatmap_hash),
+            expected)
+        self.assertEqual(reader.by_beatmap_hash("not a hash"), [])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ArchiveReader(BytesIO(b"OSRA\x01"))
+        with self.assertRaises(ValueError):
+            ArchiveReader(BytesIO((RES / "replay.osr").read_bytes()))
+
+    def test_little_endian(self):
+        # frame blocks are little endian on every platform, so archives can
+        # be read on other machines
+        replay = self._replays[0]
+        f = BytesIO()
+        with ArchiveWriter(f) as writer:
+            writer.add(replay)
+        data = f.getvalue()
+        # the block directly follows the magic and version
+        block = lzma.decompress(data[5:], format=lzma.FORMAT_RAW,
+            filters=[{"id": lzma.FILTER_LZMA2, "preset": 6}])
+        n = len(replay.replay_data)
+        time_deltas = struct.unpack_from(f"<{n}q", block)
+        xs = struct.unpack_from(f"<{n}d", block, 8 * n)
+        self.assertEqual(list(time_deltas),
+            [e.time_delta for e in replay.replay_data])
+        self.assertEqual(list(xs), [e.x for e in replay.replay_data])
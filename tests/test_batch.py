@@ -0,0 +1,70 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import shutil
+
+from osrparse import Replay, ReplayHeader, parse_many, write_many
+
+RES = Path(__file__).parent / "resources"
+
+class TestParseMany(TestCase):
+
+    def test_parse_many(self):
+        paths = sorted(RES.glob("*.osr"))
+        for executor in ["thread", "process"]:
+            results = list(parse_many(RES, workers=2, executor=executor,
+                chunksize=2))
+            self.assertEqual([path for (path, _) in results], paths)
+            for (path, replay) in results:
+                self.assertEqual(replay, Replay.from_path(path))
+
+    def test_compact_results(self):
+        results = dict(parse_many([RES / "replay.osr"], frames=False))
+        self.assertIsInstance(results[RES / "replay.osr"], ReplayHeader)
+
+        results = dict(parse_many([RES / "mania.osr"], executor="thread",
+            transform=lambda replay: len(replay.replay_data)))
+        self.assertEqual(results[RES / "mania.osr"], 17430)
+
+    def test_error_isolation(self):
+        with TemporaryDirectory() as d:
+            d = Path(d)
+            shutil.copy(RES / "replay.osr", d / "a.osr")
+            (d / "b.osr").write_bytes(b"not a replay")
+            # corrupt replay data is caught in the worker as well
+            replay = Replay.from_path(RES / "replay.osr")
+            replay._compressed_frames = replay._compressed_frames[:100]
+            replay.write_path(d / "c.osr")
+            results = dict(parse_many(d, workers=2, ordered=False))
+
+            self.assertIsInstance(results[d / "a.osr"], Replay)
+            self.assertIsInstance(results[d / "b.osr"], Exception)
+            self.assertIsInstance(results[d / "c.osr"], Exception)
+
+            # unless the replay data is left compressed
+            results = dict(parse_many(d, workers=2, lazy=True))
+            self.assertIsInstance(results[d / "c.osr"], Replay)
+            self.assertIsNotNone(results[d / "a.osr"]._compressed_frames)
+
+
+class TestWriteMany(TestCase):
+
+    def test_write_many(self):
+        replays = [Replay.from_path(path) for path in sorted(RES.glob("*.osr"))]
+        for replay in replays:
+            replay.username = "anonymous"
+
+        with TemporaryDirectory() as d:
+            d = Path(d)
+            items = [(replay, d / f"{i}.osr") for i, replay in
+                enumerate(replays)]
+            # one bad path shouldn't stop the rest from being written
+            items.append((replays[0], d / "missing" / "bad.osr"))
+            results = list(write_many(items, workers=2, profile="fast"))
+
+            self.assertEqual([path for (path, _) in results],
+                [path for (_, path) in items])
+            for (replay, path), (_, error) in zip(items[:-1], results):
+                self.assertIsNone(error)
+                self.assertEqual(Replay.from_path(path), replay)
+            self.assertIsInstance(results[-1][1], FileNotFoundError)
@@ -0,0 +1,115 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import base64
+import os
+import shutil
+
+from osrparse import (Replay, ReplayCache, ReplayDataCache, GameMode,
+    parse_many, parse_replay_data)
+
+RES = Path(__file__).parent / "resources"
+
+class TestReplayCache(TestCase):
+
+    def test_round_trip(self):
+        with TemporaryDirectory() as d:
+            for key in ["stat", "content"]:
+                cache = ReplayCache(Path(d) / key, key=key)
+                for path in sorted(RES.glob("*.osr")):
+                    replay = cache.from_path(path)
+                    cached = cache.from_path(path)
+                    self.assertEqual(replay, Replay.from_path(path))
+                    self.assertEqual(cached, replay)
+                    self.assertEqual(cached.pack(), replay.pack())
+                self.assertEqual(cache.hits, cache.misses)
+
+    def test_invalidation(self):
+        with TemporaryDirectory() as d:
+            d = Path(d)
+            path = d / "replay.osr"
+            shutil.copy(RES / "replay.osr", path)
+            cache = ReplayCache(d / "cache")
+            cache.from_path(path)
+
+            replay = Replay.from_path(RES / "replay.osr")
+            replay.username = "someone else"
+            replay.write_path(path)
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(cache.from_path(path).username, "someone else")
+            self.assertEqual(cache.misses, 2)
+
+            # a corrupt entry is treated as a miss
+            for entry in (d / "cache").iterdir():
+                entry.write_bytes(b"OSRC")
+            self.assertEqual(cache.from_path(path), replay)
+            self.assertEqual(cache.misses, 3)
+
+    def test_eviction(self):
+        with TemporaryDirectory() as d:
+            paths = sorted(RES.glob("*.osr"))
+            cache = ReplayCache(d, max_bytes=0)
+            for path in paths:
+                cache.from_path(path)
+            self.assertEqual(list(Path(d).iterdir()), [])
+
+            cache = ReplayCache(d)
+            for (path, replay) in parse_many(paths, workers=2, cache=cache):
+                self.assertEqual(replay, Replay.from_path(path))
+            self.assertEqual(len(list(Path(d).iterdir())), len(paths))
+
+            # a hit makes an entry the most recently used, so it's evicted last
+            for entry in Path(d).iterdir():
+                os.utime(entry, ns=(0, 0))
+            cache.from_path(RES / "mania.osr")
+            (entry,) = [entry for entry in Path(d).iterdir()
+                if entry.stat().st_mtime_ns]
+            cache.max_bytes = entry.stat().st_size
+            cache.evict()
+            self.assertEqual(list(Path(d).iterdir()), [entry])
+
+
+class TestReplayDataCache(TestCase):
+
+    def test_memoization(self):
+        replays = [Replay.from_path(RES / path) for path in
+            ["replay.osr", "taiko.osr", "ctb.osr"]]
+        payloads = [base64.b64encode(replay._compressed_frames).decode()
+            for replay in replays]
+        cache = ReplayDataCache(max_entries=2)
+
+        for _ in range(2):
+            for (replay, payload) in zip(replays, payloads):
+                replay_data = parse_replay_data(payload, mode=replay.mode,
+                    cache=cache)
+                self.assertEqual(replay_data, replay.replay_data)
+        # the third replay evicts the first before it's parsed again
+        self.assertEqual((cache.hits, cache.misses), (0, 6))
+        self.assertEqual(len(cache), 2)
+
+        first = parse_replay_data(payloads[2], mode=GameMode.CTB, cache=cache)
+        second = parse_replay_data(payloads[2], mode=GameMode.CTB,
+            cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(cache.hits, 2)
+        # every hit gets its own events, so modifying them doesn't affect the
+        # cache
+        first[0].x = -1000.0
+        first.clear()
+        third = parse_replay_data(payloads[2], mode=GameMode.CTB,
+            cache=cache)
+        self.assertEqual(third, second)
+        self.assertIsNot(third[0], second[0])
+        # the same data parsed as a different mode is a different entry
+        parse_replay_data(payloads[2], mode=GameMode.STD, cache=cache)
+        self.assertEqual(cache.misses, 7)
+
+        cache = ReplayDataCache(max_bytes=1)
+        parse_replay_data(payloads[0], cache=cache)
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+        # the size counts every value of every frame (an 8 byte time_delta,
+        # x, and y, and 4 byte keys for std)
+        cache = ReplayDataCache()
+        parse_replay_data(payloads[0], cache=cache)
+        self.assertGreaterEqual(cache.size, 28 * len(replays[0].replay_data))
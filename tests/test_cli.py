@@ -0,0 +1,57 @@
+from contextlib import redirect_stdout, redirect_stderr
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import csv
+import json
+
+from osrparse import Replay, GameMode
+from osrparse.cli import main
+
+RES = Path(__file__).parent / "resources"
+
+class TestCli(TestCase):
+
+    def test_dump(self):
+        with TemporaryDirectory() as d:
+            output = Path(d) / "headers.jsonl"
+            main(["dump", str(RES), "--workers", "2", "-o", str(output)])
+            rows = [json.loads(line) for line in
+                output.read_text().splitlines()]
+            self.assertEqual(len(rows), len(list(RES.glob("*.osr"))))
+            for row in rows:
+                header = Replay.from_path(row["path"], frames=False)
+                self.assertEqual(row["replay_hash"], header.replay_hash)
+                self.assertEqual(row["mods"], header.mods.value)
+
+            output = Path(d) / "frames.csv"
+            main(["dump", str(RES / "ctb.osr"), "--frames", "--format", "csv",
+                "-o", str(output)])
+            with open(output, newline="") as f:
+                rows = list(csv.DictReader(f))
+            replay = Replay.from_path(RES / "ctb.osr")
+            self.assertEqual(len(rows), len(replay.replay_data))
+            self.assertEqual(float(rows[5]["x"]), replay.replay_data[5].x)
+            self.assertEqual(int(rows[-1]["time"]),
+                sum(e.time_delta for e in replay.replay_data))
+
+    def test_convert(self):
+        with TemporaryDirectory() as d:
+            with redirect_stderr(StringIO()):
+                main(["convert", str(RES), "-o", d, "--profile", "fast",
+                    "--workers", "2"])
+            for path in RES.glob("*.osr"):
+                self.assertEqual(Replay.from_path(Path(d) / path.name),
+                    Replay.from_path(path))
+
+    def test_stat_and_bench(self):
+        out = StringIO()
+        with redirect_stdout(out):
+            main(["stat", str(RES)])
+            main(["bench", str(RES / "mania.osr"), "--workers", "1"])
+        out = out.getvalue()
+        self.assertIn(f"replays:  {len(list(RES.glob('*.osr')))} (0 failed)",
+            out)
+        self.assertIn(f"{GameMode.MANIA.name} 1", out)
+        self.assertIn("frames/s", out)
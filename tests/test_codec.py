@@ -0,0 +1,41 @@
+from pathlib import Path
+from unittest import TestCase
+
+from osrparse import Replay, GameMode
+from osrparse.replay import _Unpacker
+from osrparse.codec import encode, decode, decode_replay_data
+
+RES = Path(__file__).parent / "resources"
+
+class TestCodec(TestCase):
+
+    def test_round_trip(self):
+        for path in sorted(RES.glob("*.osr")):
+            replay = Replay.from_path(path)
+            compressed = replay._compressed_frames
+            data = _Unpacker.decompress(compressed)
+            for compression in ["none", "lzma"]:
+                encoded = encode(data, compression=compression)
+                self.assertEqual(decode(encoded), data)
+                self.assertEqual(decode_replay_data(encoded, replay.mode),
+                    (replay.replay_data, replay.rng_seed))
+            # the encoded replay data should be smaller than the original
+            self.assertLess(len(encoded), len(compressed))
+
+    def test_irregular_values(self):
+        data = ("0|256|-500|0,1|2.50|-0|4,2|1e-05|-0.0|3,3|.5|+1|0,"
+            "4|123.4567891234|1|1,5|99999999999999999999999|7|0,"
+            "-12345|0|0|1234")
+        encoded = encode(data)
+        self.assertEqual(decode(encoded), data)
+        (replay_data, rng_seed) = decode_replay_data(encoded, GameMode.STD)
+        self.assertEqual((replay_data, rng_seed),
+            _Unpacker.parse_replay_data(data, GameMode.STD))
+        self.assertEqual(rng_seed, 1234)
+
+        for data in ["", ",", "0|1|2|3"]:
+            self.assertEqual(decode(encode(data)), data)
+        with self.assertRaises(ValueError):
+            encode("1|2|3")
+        with self.assertRaises(ValueError):
+            decode(b"not encoded")
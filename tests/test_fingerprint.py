@@ -0,0 +1,60 @@
+from dataclasses import replace
+from pathlib import Path
+from unittest import TestCase
+
+from osrparse import Replay, Mod
+from osrparse.fingerprint import (fingerprint, fingerprint_many,
+    find_duplicates)
+
+RES = Path(__file__).parent / "resources"
+
+class TestFingerprint(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fingerprints = dict((path.name, fp) for (path, fp) in
+            fingerprint_many(RES, executor="thread"))
+
+    def test_fingerprint(self):
+        replay = Replay.from_path(RES / "replay.osr")
+        fp = fingerprint(replay)
+        self.assertEqual(fp, self.fingerprints["replay.osr"])
+        self.assertEqual(len(fp.signature), 64)
+        self.assertEqual(fp.similarity(fp), 1)
+        self.assertLess(fp.similarity(self.fingerprints["replay2.osr"]), 0.2)
+
+    def test_stolen_replay(self):
+        # a copy re-played with HardRock (which flips the playfield) and
+        # trimmed should still be found
+        replay = Replay.from_path(RES / "replay.osr")
+        replay.mods |= Mod.HardRock
+        replay.replay_data = [type(e)(e.time_delta, e.x, 384 - e.y, e.keys)
+            for e in replay.replay_data[:-2000]]
+        replay.replay_hash = "stolen"
+        replay.rng_seed = None
+
+        fingerprints = dict(self.fingerprints, stolen=fingerprint(replay))
+        matches = find_duplicates(fingerprints.items(), threshold=0.8)
+        pairs = {(m.a, m.b): m for m in matches}
+        self.assertEqual(pairs[("replay.osr", "stolen")].reason, "similar")
+        self.assertGreater(pairs[("replay.osr", "stolen")].similarity, 0.8)
+        # these two are the same play, saved by different clients
+        self.assertIn(("replay2.osr", "replay_old_replayid.osr"), pairs)
+        self.assertEqual(len(matches), 2)
+
+    def test_exact_matches(self):
+        fp = self.fingerprints["mania.osr"]
+        # no replay data in common, but the same replay hash or rng seed
+        same_hash = replace(fp, rng_seed=None, signature=())
+        same_seed = replace(fp, replay_hash="", signature=())
+        fingerprints = [("a", fp), ("b", same_hash), ("c", same_seed),
+            ("d", ValueError("could not parse"))]
+        matches = find_duplicates(fingerprints)
+        self.assertEqual([(m.a, m.b, m.reason) for m in matches],
+            [("a", "b", "replay_hash"), ("a", "c", "rng_seed")])
+
+        other_beatmap = replace(same_hash, beatmap_hash="other")
+        self.assertEqual(find_duplicates([("a", fp), ("b", other_beatmap)]),
+            [])
+        self.assertEqual(len(find_duplicates([("a", fp), ("b",
+            other_beatmap)], same_beatmap=False)), 1)
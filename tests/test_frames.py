@@ -0,0 +1,110 @@
+from pathlib import Path
+from unittest import TestCase, skipIf
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from osrparse import Replay, GameMode
+
+RES = Path(__file__).parent / "resources"
+PATHS = ["replay.osr", "taiko.osr", "ctb.osr", "mania.osr",
+    "lazer_standard_format.osr"]
+
+@skipIf(np is None, "numpy is not installed")
+class TestFramesArray(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._replays = [Replay.from_path(RES / path) for path in PATHS]
+
+    def test_frames_array(self):
+        from osrparse.frames import frames_from_events, events_from_frames
+
+        for replay in self._replays:
+            frames = replay.frames_array()
+            self.assertEqual(len(frames), len(replay.replay_data))
+            # once the replay data is accessed, the array is built from events
+            # instead
+            self.assertTrue(np.array_equal(frames, replay.frames_array()))
+            self.assertTrue(np.array_equal(frames,
+                frames_from_events(replay.replay_data, replay.mode)))
+            self.assertEqual(events_from_frames(frames, replay.mode),
+                replay.replay_data)
+
+    def test_pack_frames(self):
+        for path in PATHS:
+            replay = Replay.from_path(RES / path)
+            frames = replay.frames_array()[:500]
+            frames["time_delta"] += 1
+            replay2 = Replay.from_string(replay.pack(frames=frames))
+            self.assertTrue(np.array_equal(replay2.frames_array(), frames))
+            self.assertEqual(replay2.rng_seed, replay.rng_seed)
+
+    def test_pack_frames_lazily(self):
+        # writing frames of a replay whose replay data was never accessed
+        # doesn't create events for it, but keeps its rng seed
+        for path in PATHS:
+            replay = Replay.from_path(RES / path)
+            frames = replay.frames_array()
+            data = replay.pack(frames=frames)
+            self.assertIsNotNone(replay._compressed_frames)
+            self.assertEqual(Replay.from_string(data).rng_seed,
+                Replay.from_path(RES / path).rng_seed)
+
+            replay = Replay.from_path(RES / path)
+            data = replay.pack(frames=frames)
+            self.assertIsNotNone(replay._compressed_frames)
+            self.assertEqual(Replay.from_string(data).rng_seed,
+                Replay.from_path(RES / path).rng_seed)
+
+    def test_pack_numpy_scalars(self):
+        # events may hold numpy scalars, for instance after editing them with
+        # numpy. They must be written as their value.
+        replay = Replay.from_path(RES / "replay.osr")
+        replay.replay_data = replay.replay_data[:10]
+        replay.replay_data[0].x = np.float64(12.5)
+        replay.replay_data[0].y = np.float32(3.25)
+        replay2 = Replay.from_string(replay.pack())
+        self.assertEqual(replay2.replay_data[0].x, 12.5)
+        self.assertEqual(replay2.replay_data[0].y, 3.25)
+
+    def test_key_intervals(self):
+        from osrparse.frames import key_intervals
+
+        for replay in self._replays:
+            if replay.mode is GameMode.CTB:
+                continue
+            frames = replay.frames_array()
+            intervals = key_intervals(frames)
+
+            # compare against a straightforward python implementation
+            time = 0
+            pressed = {}
+            expected = {key: [] for key in intervals}
+            for event in replay.replay_data:
+                time += event.time_delta
+                for key in intervals:
+                    if key in event.keys and key not in pressed:
+                        pressed[key] = time
+                    if key not in event.keys and key in pressed:
+                        expected[key].append([pressed.pop(key), time])
+            for key, press in pressed.items():
+                expected[key].append([press, time])
+
+            for key, value in intervals.items():
+                self.assertEqual(value.tolist(), expected[key])
+
+    def test_kinematics(self):
+        from osrparse.frames import kinematics
+
+        frames = self._replays[0].frames_array()
+        k = kinematics(frames)
+        self.assertEqual(k.time[-1], frames["time_delta"].sum())
+        self.assertEqual(k.velocity.shape, (len(frames), 2))
+        i = np.flatnonzero(frames["time_delta"] > 0)[1]
+        dt = frames["time_delta"][i]
+        self.assertAlmostEqual(k.velocity[i, 0],
+            (frames["x"][i] - frames["x"][i - 1]) / dt)
+        self.assertTrue(np.isnan(k.velocity[0]).all())
@@ -0,0 +1,99 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+import shutil
+import subprocess
+import sys
+
+from osrparse import Replay, ReplayIndex, Mod, GameMode
+from osrparse.cli import main
+
+RES = Path(__file__).parent / "resources"
+
+class TestReplayIndex(TestCase):
+
+    def test_index(self):
+        with TemporaryDirectory() as d:
+            d = Path(d)
+            replays = d / "replays"
+            shutil.copytree(RES, replays)
+            paths = sorted(replays.glob("*.osr"))
+
+            with ReplayIndex(d / "index.db") as index:
+                result = index.update(replays, workers=2)
+                self.assertEqual((result.added, result.unchanged),
+                    (len(paths), 0))
+                self.assertEqual(len(index), len(paths))
+
+                for (path, header) in index.query():
+                    self.assertEqual(header,
+                        Replay.from_path(path, frames=False))
+                    # the recorded offset points at the replay data
+                    replay = Replay.from_path(path)
+                    (offset, length) = index.connection.execute(
+                        "SELECT frames_offset, frames_length FROM replays "
+                        "WHERE path = ?", [path]).fetchone()
+                    with open(path, "rb") as f:
+                        f.seek(offset)
+                        self.assertEqual(f.read(length),
+                            replay._compressed_frames)
+
+                header = Replay.from_path(replays / "replay.osr",
+                    frames=False)
+                results = index.query(beatmap_hash=header.beatmap_hash,
+                    username=header.username, mods=header.mods)
+                self.assertIn(str(replays / "replay.osr"),
+                    [path for (path, _) in results])
+                self.assertTrue(all(h.mods == header.mods and
+                    h.username == header.username for (_, h) in results))
+                for (_, h) in index.query(include_mods=Mod.Hidden):
+                    self.assertIn(Mod.Hidden, h.mods)
+                self.assertEqual(len(index.query(mode=GameMode.TAIKO)), 1)
+
+            # rescans only touch changed files
+            replay = Replay.from_path(paths[0])
+            replay.username = "someone else"
+            replay.write_path(paths[0])
+            os.remove(paths[1])
+            (replays / "corrupt.osr").write_bytes(b"\x00")
+
+            with ReplayIndex(d / "index.db") as index:
+                result = index.update([replays], executor="thread")
+                self.assertEqual((result.added, result.updated,
+                    result.removed, result.unchanged),
+                    (0, 1, 1, len(paths) - 2))
+                self.assertEqual([path for (path, _) in result.errors],
+                    [str(replays / "corrupt.osr")])
+                self.assertEqual(len(index.query(username="someone else")),
+                    1)
+
+    def test_prune_case_sensitive(self):
+        with TemporaryDirectory() as d:
+            d = Path(d)
+            (d / "a").mkdir()
+            (d / "A").mkdir()
+            shutil.copy(RES / "replay.osr", d / "a")
+
+            with ReplayIndex(d / "index.db") as index:
+                index.update(d / "a", executor="thread")
+                # a directory whose name only differs in case doesn't prune
+                # replays in the other
+                result = index.update(d / "A", executor="thread")
+                self.assertEqual(result.removed, 0)
+                self.assertEqual(len(index), 1)
+
+    def test_cli(self):
+        with TemporaryDirectory() as d:
+            main(["index", str(Path(d) / "index.db"), str(RES),
+                "--workers", "2"])
+            with ReplayIndex(Path(d) / "index.db") as index:
+                self.assertEqual(len(index), len(list(RES.glob("*.osr"))))
+
+    def test_lazy_import(self):
+        # importing osrparse doesn't import sqlite3 until the index is used
+        code = ("import sys, osrparse; "
+            "assert 'sqlite3' not in sys.modules; "
+            "osrparse.ReplayIndex; "
+            "assert 'sqlite3' in sys.modules")
+        subprocess.run([sys.executable, "-c", code], check=True)
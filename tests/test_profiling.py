@@ -0,0 +1,67 @@
+import io
+import pickle
+from pathlib import Path
+from unittest import TestCase
+
+from osrparse import Replay
+from osrparse.replay import _Unpacker, _Packer
+from osrparse.profiling import profile, ProfileStats
+
+RES = Path(__file__).parent / "resources"
+
+class TestProfiling(TestCase):
+
+    def test_stages(self):
+        calls = []
+        with profile(callback=lambda stage, stats: calls.append(stage)) as (
+            stats):
+            replay = Replay.from_path(RES / "replay.osr")
+            replay.replay_data
+            replay.write_file(io.BytesIO(), profile="fast")
+
+        self.assertEqual(set(stats.stages), {"header", "life_bar",
+            "replay_id", "decompress", "tokenize", "build_events",
+            "pack_header", "format", "compress"})
+        self.assertEqual(calls[:6], ["header", "life_bar", "replay_id",
+            "decompress", "tokenize", "build_events"])
+        decompress = stats.stages["decompress"]
+        self.assertEqual(decompress.calls, 1)
+        self.assertGreater(decompress.bytes_out, decompress.bytes_in)
+        self.assertEqual(stats.stages["tokenize"].bytes_in,
+            decompress.bytes_out)
+        self.assertEqual(stats.stages["build_events"].frames,
+            len(replay.replay_data))
+        self.assertEqual(stats.stages["format"].frames,
+            len(replay.replay_data))
+        self.assertGreater(stats.seconds, 0)
+        self.assertEqual(stats.as_dict()["decompress"]["calls"], 1)
+
+    def test_disabled(self):
+        originals = (_Unpacker.__dict__["decompress"],
+            _Packer.__dict__["format_events"])
+        with profile():
+            with profile() as stats:
+                self.assertIsNot(_Unpacker.__dict__["decompress"],
+                    originals[0])
+            # the outer block is still active
+            self.assertIsNot(_Unpacker.__dict__["decompress"], originals[0])
+        # and afterwards, parsing runs the original methods
+        self.assertEqual((_Unpacker.__dict__["decompress"],
+            _Packer.__dict__["format_events"]), originals)
+
+        Replay.from_path(RES / "replay.osr").replay_data
+        self.assertEqual(stats.stages, {})
+
+    def test_merge(self):
+        with profile() as stats:
+            Replay.from_path(RES / "mania.osr").replay_data
+        # stats pickle, so they can be sent back from worker processes
+        merged = pickle.loads(pickle.dumps(stats))
+        merged.merge(stats)
+        self.assertEqual(merged.stages["decompress"].calls, 2)
+        self.assertEqual(merged.stages["build_events"].frames,
+            2 * stats.stages["build_events"].frames)
+
+        merged.reset()
+        self.assertEqual(merged.as_dict(), {})
+        self.assertIsInstance(merged, ProfileStats)
@@ -1,8 +1,13 @@
+import gzip
+import struct
+from io import BytesIO
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from datetime import datetime, timezone
 from osrparse import (ReplayEventOsu, GameMode, Mod, ReplayEventTaiko,
-    ReplayEventCatch, ReplayEventMania, Replay)
+    ReplayEventCatch, ReplayEventMania, Replay, ReplayHeader)
+from osrparse.replay import _Unpacker
 
 RES = Path(__file__).parent / "resources"
 
@@ -66,6 +71,8 @@ class TestStandardReplay(TestCase):
         for replay in self._replays:
             self.assertIsInstance(replay.replay_data[0], ReplayEventOsu, "Replay data is wrong")
             self.assertEqual(len(replay.replay_data), 17498, "Replay data is wrong")
+            # events are slotted to keep per-frame memory down
+            self.assertFalse(hasattr(replay.replay_data[0], "__dict__"))
 
     def test_replay_id(self):
         for replay in self._replays:
@@ -74,6 +81,156 @@ class TestStandardReplay(TestCase):
         # we can parse it properly instead of erroring
         self.assertEqual(self._old_replayid_replay.replay_id, 1127598189)
 
+    def test_header(self):
+        header = Replay.from_path(RES / "replay.osr", frames=False)
+        self.assertIsInstance(header, ReplayHeader)
+        replay = self._replays[0]
+        for attr in ["mode", "game_version", "beatmap_hash", "username",
+            "replay_hash", "count_300", "count_100", "count_50", "count_geki",
+            "count_katu", "count_miss", "score", "max_combo", "perfect",
+            "mods", "timestamp", "replay_id"]:
+            self.assertEqual(getattr(header, attr), getattr(replay, attr), attr)
+
+        header = Replay.from_path(RES / "replay_old_replayid.osr",
+            frames=False)
+        self.assertEqual(header.replay_id, 1127598189)
+
+    def test_header_seeks(self):
+        # header-only parsing of a file seeks over the replay data instead of
+        # reading it
+        class CountingFile(BytesIO):
+            read_bytes = 0
+            def read(self, size=-1):
+                data = super().read(size)
+                self.read_bytes += len(data)
+                return data
+
+        for path in sorted(RES.glob("*.osr")):
+            data = path.read_bytes()
+            f = CountingFile(data)
+            header = Replay.from_file(f, frames=False)
+            self.assertEqual(header, Replay.from_string(data, frames=False))
+            self.assertLess(f.read_bytes, len(data) // 4)
+
+    def test_buffers(self):
+        replay = self._replays[0]
+        with open(RES / "replay.osr", "rb") as f:
+            data = f.read()
+        self.assertEqual(Replay.from_path(RES / "replay.osr", mmap=True),
+            replay)
+        self.assertEqual(Replay.from_string(bytearray(data)), replay)
+        self.assertEqual(Replay.from_string(memoryview(data)), replay)
+
+        header = Replay.from_path(RES / "replay.osr", frames=False, mmap=True)
+        self.assertEqual(header.replay_id, replay.replay_id)
+
+    def test_lazy_replay_data(self):
+        with open(RES / "replay.osr", "rb") as f:
+            data = f.read()
+        replay = Replay.from_string(data)
+        # untouched replay data is written back without being recompressed
+        self.assertEqual(replay.pack(), data)
+
+        self.assertEqual(len(replay.replay_data), 17498)
+        replay.replay_data = replay.replay_data[:100]
+        replay2 = Replay.from_string(replay.pack())
+        self.assertEqual(replay2.replay_data, replay.replay_data)
+
+    def test_iter_frames(self):
+        replay = self._replays[0]
+        frames = list(Replay.iter_frames(RES / "replay.osr", chunk_size=1000))
+        self.assertEqual(frames, replay.replay_data)
+
+        with open(RES / "replay.osr", "rb") as f:
+            data = f.read()
+        frames = Replay.iter_frames(data)
+        self.assertEqual(next(frames), replay.replay_data[0])
+        frames.close()
+
+    def test_frames_between(self):
+        replay = self._replays[0]
+        expected = []
+        time_ = 0
+        for event in replay.replay_data:
+            time_ += event.time_delta
+            if 1000 <= time_ < 3000:
+                expected.append(event)
+        self.assertTrue(expected)
+
+        self.assertEqual(list(Replay.iter_frames(RES / "replay.osr",
+            start=1000, stop=3000)), expected)
+        # parsed lazily, without touching the rest of the replay data
+        lazy = Replay.from_path(RES / "replay.osr")
+        self.assertEqual(lazy.frames_between(1000, 3000), expected)
+        self.assertIsNotNone(lazy._compressed_frames)
+        # and from already parsed replay data
+        self.assertEqual(replay.frames_between(1000, 3000), expected)
+
+    def test_frame_at(self):
+        replay = Replay.from_path(RES / "replay.osr")
+        times = []
+        time_ = 0
+        for event in replay.replay_data:
+            time_ += event.time_delta
+            times.append(max(time_, times[-1]) if times else time_)
+
+        self.assertIsNone(replay.frame_at(times[0] - 1))
+        self.assertEqual(replay.frame_at(times[-1] + 1000),
+            replay.replay_data[-1])
+        for i in range(0, len(times), 997):
+            # the last event at the same time as the i-th
+            j = max(k for k in range(len(times)) if times[k] == times[i])
+            self.assertIs(replay.frame_at(times[i]), replay.replay_data[j])
+
+        # assigning replay data invalidates the seek index
+        replay.replay_data = replay.replay_data[:10]
+        self.assertEqual(replay.frame_at(times[-1]), replay.replay_data[-1])
+
+    def test_timestamp_ticks(self):
+        # ticks are rounded to microseconds half to even
+        for (ticks, microseconds) in [(14, 1), (15, 2), (25, 2), (26, 3)]:
+            unpacker = _Unpacker(struct.pack("<q", ticks))
+            self.assertEqual(unpacker.unpack_timestamp().microsecond,
+                microseconds)
+
+    def test_write_file(self):
+        replay = Replay.from_path(RES / "replay.osr")
+        replay.replay_data = replay.replay_data[:1000]
+        for profile in [None, "fast", "small"]:
+            f = BytesIO()
+            replay.write_file(f, profile=profile)
+            self.assertEqual(f.getvalue(), replay.pack(profile=profile))
+            self.assertEqual(Replay.from_string(f.getvalue()), replay)
+
+        # unseekable files have their replay data buffered instead
+        class Unseekable(BytesIO):
+            def seekable(self):
+                return False
+        f = Unseekable()
+        replay.write_file(f)
+        self.assertEqual(f.getvalue(), replay.pack())
+
+        with TemporaryDirectory() as d:
+            # compressed files claim to be seekable, but can't seek backwards
+            # while writing
+            path = Path(d) / "replay.osr.gz"
+            with gzip.open(path, "wb") as f:
+                replay.write_file(f)
+            with gzip.open(path, "rb") as f:
+                self.assertEqual(f.read(), replay.pack())
+
+            # and files opened in append mode write at the end regardless of
+            # where they seek to
+            path = Path(d) / "replays.bin"
+            path.write_bytes(b"header")
+            with open(path, "ab") as f:
+                replay.write_file(f)
+            self.assertEqual(path.read_bytes(), b"header" + replay.pack())
+
+            path = Path(d) / "replay.osr"
+            replay.write_path(path)
+            self.assertEqual(path.read_bytes(), replay.pack())
+
 class TestTaikoReplay(TestCase):
 
     @classmethod